@@ -1,15 +1,40 @@
 # app.py
-from flask import Flask, jsonify, request, url_for
+from flask import Flask, g, jsonify, request, url_for, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_restless import APIManager
 from datetime import datetime, timezone
 from flask_cors import CORS
 from dotenv import load_dotenv
 from pathlib import Path
+from search_index import SearchIndex, tokenize
+from geo_index import GeoIndex, haversine_km
+from highlight import Highlighter
+from serializer import FastJSONProvider, ResourceSerializer
 import os
-from sqlalchemy import asc, desc, or_, func
-from sqlalchemy.orm import joinedload
-import re
+from sqlalchemy import asc, desc, or_, and_, func, distinct, event, inspect
+from sqlalchemy import DDL, text, table, column, literal, literal_column, false, case
+from sqlalchemy import exists, insert, null, select, tuple_, type_coerce
+from sqlalchemy import union, union_all
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, load_only, Session
+from collections import defaultdict, OrderedDict
+import time
+import json
+import base64
+import threading
+import heapq
+import hashlib
+import itertools
+import functools
+import math
+import operator
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
 
 TYPES = {
     "counseling": [
@@ -85,6 +110,7 @@ load_dotenv(dotenv_path=env_path, override=True)
 
 # connect to mysql database using sql alchemy
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app, origins=["https://www.fosterfledging.me"])  # enable Cross Origin Sharing
 
 # Decide which DB to use (when running tests vs. when not)
@@ -98,6 +124,12 @@ else:
         f"{os.environ['MYSQL_DB']}"
     )
 
+# "index" ranks search_all with the in-memory BM25 index, "fulltext" with the
+# database's full-text index and "like" with ILIKE scans
+app.config["SEARCH_BACKEND"] = os.environ.get("SEARCH_BACKEND", "index")
+# ?search= on the list endpoints: "fulltext" or the "like" fallback
+app.config["LIST_SEARCH_BACKEND"] = os.environ.get("LIST_SEARCH_BACKEND", "fulltext")
+
 # get the database
 db = SQLAlchemy(app)
 
@@ -106,6 +138,8 @@ housing_state = db.Table(
     "housing_state",
     db.Column("housing_id", db.Integer, db.ForeignKey("housing.id"), primary_key=True),
     db.Column("state_id", db.Integer, db.ForeignKey("state.id"), primary_key=True),
+    # the primary key serves resource -> states, this one states -> resources
+    db.Index("ix_housing_state_state_id", "state_id", "housing_id"),
 )
 
 counseling_state = db.Table(
@@ -114,6 +148,7 @@ counseling_state = db.Table(
         "counseling_id", db.Integer, db.ForeignKey("counseling.id"), primary_key=True
     ),
     db.Column("state_id", db.Integer, db.ForeignKey("state.id"), primary_key=True),
+    db.Index("ix_counseling_state_state_id", "state_id", "counseling_id"),
 )
 
 organization_state = db.Table(
@@ -125,6 +160,43 @@ organization_state = db.Table(
         primary_key=True,
     ),
     db.Column("state_id", db.Integer, db.ForeignKey("state.id"), primary_key=True),
+    db.Index("ix_organization_state_state_id", "state_id", "organization_id"),
+)
+
+# Place types, normalized out of the "types" JSON so filter[types] can use an
+# index. The (type_id, resource id) indexes serve lookups by type.
+housing_type = db.Table(
+    "housing_type",
+    db.Column("housing_id", db.Integer, db.ForeignKey("housing.id"), primary_key=True),
+    db.Column(
+        "type_id", db.Integer, db.ForeignKey("resource_type.id"), primary_key=True
+    ),
+    db.Index("ix_housing_type_type_id", "type_id", "housing_id"),
+)
+
+counseling_type = db.Table(
+    "counseling_type",
+    db.Column(
+        "counseling_id", db.Integer, db.ForeignKey("counseling.id"), primary_key=True
+    ),
+    db.Column(
+        "type_id", db.Integer, db.ForeignKey("resource_type.id"), primary_key=True
+    ),
+    db.Index("ix_counseling_type_type_id", "type_id", "counseling_id"),
+)
+
+organization_type = db.Table(
+    "organization_type",
+    db.Column(
+        "organization_id",
+        db.Integer,
+        db.ForeignKey("organizations.id"),
+        primary_key=True,
+    ),
+    db.Column(
+        "type_id", db.Integer, db.ForeignKey("resource_type.id"), primary_key=True
+    ),
+    db.Index("ix_organization_type_type_id", "type_id", "organization_id"),
 )
 
 
@@ -193,12 +265,903 @@ class Organizations(db.Model):
     retrieved_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
 
+# Secondary indexes for the filter and sort shapes of apply_query_options:
+# ORDER BY <field>, id (and keyword = ... ORDER BY id) walk a (field, id)
+# index, and the filter[bbox] range fallback uses (lat, lng).
+INDEXED_SORT_FIELDS = ["name", "rating", "state", "category", "keyword"]
+
+for _Model in (Housing, Counseling, Organizations):
+    for _field in INDEXED_SORT_FIELDS:
+        db.Index(
+            f"ix_{_Model.__tablename__}_{_field}_id",
+            getattr(_Model, _field),
+            _Model.id,
+        )
+    db.Index(f"ix_{_Model.__tablename__}_lat_lng", _Model.lat, _Model.lng)
+
+
 class State(db.Model):
     __tablename__ = "state"
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
 
 
+class ResourceType(db.Model):
+    """One Google Places type, e.g. "lodging"."""
+
+    __tablename__ = "resource_type"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+
+class DataVersion(db.Model):
+    """Write counter per table, bumped by setup_db.py and the scraper."""
+
+    __tablename__ = "data_version"
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+# Per-table write counters. Any ORM flush in this process bumps the local
+# counter right away; writes from other processes show up through the
+# data_version table, which is polled at most every DATA_VERSION_POLL seconds.
+# Cached results stored under an older version are never served.
+DATA_VERSION_POLL = 5  # seconds
+_table_versions = defaultdict(int)
+_table_modified = {}
+_shared_versions = {}
+_shared_modified = {}
+_shared_versions_polled = None
+
+
+def poll_shared_versions():
+    global _shared_versions, _shared_modified, _shared_versions_polled
+    now = time.monotonic()
+    if (
+        _shared_versions_polled is not None
+        and now - _shared_versions_polled < DATA_VERSION_POLL
+    ):
+        return _shared_versions
+    _shared_versions_polled = now
+    try:
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                db.select(
+                    DataVersion.table_name, DataVersion.version, DataVersion.updated_at
+                )
+            ).all()
+        _shared_versions = {name: version for name, version, _ in rows}
+        _shared_modified = {name: updated for name, _, updated in rows if updated}
+    except SQLAlchemyError:
+        # table not created yet (setup_db.py has not run), keep the old view
+        pass
+    return _shared_versions
+
+
+def table_version(table_name):
+    return (_table_versions[table_name], poll_shared_versions().get(table_name, 0))
+
+
+def table_modified(table_name):
+    """Last known write to the table as an aware UTC datetime, or None."""
+    poll_shared_versions()
+    stamps = [_shared_modified.get(table_name), _table_modified.get(table_name)]
+    stamps = [s if s.tzinfo else s.replace(tzinfo=timezone.utc) for s in stamps if s]
+    return max(stamps, default=None)
+
+
+def mark_tables_changed(*table_names):
+    """Record a write to the given tables for every API worker to see."""
+    now = datetime.now(timezone.utc)
+    for name in table_names:
+        row = db.session.get(DataVersion, name)
+        if row is None:
+            db.session.add(DataVersion(table_name=name, version=1, updated_at=now))
+        else:
+            row.version += 1
+            row.updated_at = now
+    db.session.commit()
+
+
+@event.listens_for(Session, "after_flush")
+def bump_table_versions(session, flush_context):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        table_name = getattr(instance, "__tablename__", None)
+        if table_name:
+            _table_versions[table_name] += 1
+            _table_modified[table_name] = datetime.now(timezone.utc)
+
+
+# How each model is linked to its states, and which models are listed under
+# its in_state_resources.
+STATE_LINKS = {
+    Housing: housing_state.c.housing_id,
+    Counseling: counseling_state.c.counseling_id,
+    Organizations: organization_state.c.organization_id,
+}
+
+
+def state_name_of(Model):
+    """SQL for the State name a row links to: its trimmed state or "Unknown"."""
+    return case(
+        (or_(Model.state.is_(None), Model.state == ""), literal("Unknown")),
+        else_=func.trim(Model.state),
+    )
+
+
+def linked_id_floors():
+    """The highest id already linked to a state, per model.
+
+    Rows above it were added since setup_db.py last ran, so incremental runs
+    hand it to link_states and sync_resource_types.
+    """
+    with db.engine.connect() as connection:
+        return {
+            Model: connection.execute(select(func.max(key))).scalar() or 0
+            for Model, key in STATE_LINKS.items()
+        }
+
+
+def link_states(incremental=False, floors=None):
+    """Link rows to the State named by their state column (setup_db.py).
+
+    Runs as a few set-based statements, whatever the row count: one query for
+    the state names that do not exist yet, one insert for them, then one
+    INSERT ... SELECT per *_state table for the pairs it lacks. incremental
+    only looks at rows with ids above the highest one already linked, i.e.
+    rows added since the last run; floors gives those ids instead.
+
+    Returns the names of the states created and the number of links added.
+    """
+    state_table = State.__table__
+    if floors is None:
+        floors = linked_id_floors() if incremental else {}
+    floors = {Model: floors.get(Model, 0) for Model in STATE_LINKS}
+    with db.engine.begin() as connection:
+        names = union(
+            *[
+                select(state_name_of(Model).label("name")).where(Model.id > floor)
+                for Model, floor in floors.items()
+            ]
+        ).subquery()
+        missing = select(names.c.name).where(
+            ~exists().where(state_table.c.name == names.c.name)
+        )
+        created = sorted(connection.execute(missing).scalars())
+        if created:
+            connection.execute(
+                insert(state_table)
+                .prefix_with("IGNORE", dialect="mysql")
+                .prefix_with("OR IGNORE", dialect="sqlite"),
+                [{"name": name} for name in created],
+            )
+
+        linked = 0
+        for Model, key in STATE_LINKS.items():
+            link_table = key.table
+            pairs = (
+                select(Model.id, state_table.c.id)
+                .join(state_table, state_table.c.name == state_name_of(Model))
+                .where(Model.id > floors[Model])
+                .where(
+                    ~exists().where(
+                        key == Model.id, link_table.c.state_id == state_table.c.id
+                    )
+                )
+            )
+            result = connection.execute(
+                insert(link_table).from_select([key.name, "state_id"], pairs)
+            )
+            linked += result.rowcount
+    return created, linked
+
+
+# How each model is linked to its resource types
+TYPE_LINKS = {
+    Housing: housing_type.c.housing_id,
+    Counseling: counseling_type.c.counseling_id,
+    Organizations: organization_type.c.organization_id,
+}
+# Ids per IN (...) list when syncing type links
+TYPE_SYNC_CHUNK = 500
+# Stale (id, type id) pairs per DELETE, under SQLite's 999 variable limit
+TYPE_DELETE_CHUNK = 300
+
+
+def type_ids_for(connection, names):
+    """Map type names to resource_type ids, creating the missing ones."""
+    if not names:
+        return {}
+    type_table = ResourceType.__table__
+    lookup = select(type_table.c.name, type_table.c.id).where(
+        type_table.c.name.in_(names)
+    )
+    found = dict(connection.execute(lookup).all())
+    missing = [name for name in names if name not in found]
+    if missing:
+        # another writer may add the same names concurrently
+        connection.execute(
+            insert(type_table)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite"),
+            [{"name": name} for name in missing],
+        )
+        found = dict(connection.execute(lookup).all())
+    return found
+
+
+def sync_type_links(connection, Model, rows):
+    """Make Model's type links match [(id, types list)]; returns links changed.
+
+    Only the difference is written: links that exist and are still wanted are
+    left alone.
+    """
+    key = TYPE_LINKS[Model]
+    link_table = key.table
+    changed = 0
+    for chunk in batched(rows, TYPE_SYNC_CHUNK):
+        names = sorted({name for _, types in chunk for name in types or []})
+        type_ids = type_ids_for(connection, names)
+        wanted = {
+            (id, type_ids[name]) for id, types in chunk for name in types or []
+        }
+        ids = [id for id, _ in chunk]
+        existing = set(
+            connection.execute(
+                select(key, link_table.c.type_id).where(key.in_(ids))
+            ).all()
+        )
+        stale = existing - wanted
+        added = wanted - existing
+        for pairs in batched(sorted(stale), TYPE_DELETE_CHUNK):
+            # the key IN list lets the pair match use the link table's index
+            connection.execute(
+                link_table.delete().where(
+                    key.in_({id for id, _ in pairs}),
+                    tuple_(key, link_table.c.type_id).in_(pairs),
+                )
+            )
+        if added:
+            connection.execute(
+                insert(link_table),
+                [{key.name: id, "type_id": type_id} for id, type_id in added],
+            )
+        changed += len(stale) + len(added)
+    return changed
+
+
+def sync_resource_types(floors=None):
+    """Rebuild every model's type links from its types JSON (setup_db.py).
+
+    floors ({Model: id}, see linked_id_floors) limits the sync to rows above
+    those ids.
+    """
+    floors = floors or {}
+    changed = 0
+    with db.engine.begin() as connection:
+        for Model in TYPE_LINKS:
+            rows = connection.execute(
+                select(Model.id, Model.types).where(Model.id > floors.get(Model, 0))
+            ).all()
+            changed += sync_type_links(connection, Model, rows)
+    return changed
+
+
+# ORM writes keep the links current inside the flush's own transaction
+def link_types_on_insert(mapper, connection, target):
+    types = inspect(target).dict.get("types")
+    if types:
+        sync_type_links(connection, type(target), [(target.id, types)])
+
+
+def link_types_on_update(mapper, connection, target):
+    state = inspect(target)
+    if "types" in state.dict and state.attrs.types.history.has_changes():
+        sync_type_links(connection, type(target), [(target.id, target.types)])
+
+
+def unlink_types_on_delete(mapper, connection, target):
+    sync_type_links(connection, type(target), [(target.id, [])])
+
+
+for _Model in TYPE_LINKS:
+    event.listen(_Model, "after_insert", link_types_on_insert)
+    event.listen(_Model, "after_update", link_types_on_update)
+    event.listen(_Model, "before_delete", unlink_types_on_delete)
+
+
+RELATED_RESOURCES = {
+    Housing: [(Counseling, "counseling"), (Organizations, "organizations")],
+    Counseling: [(Housing, "housing"), (Organizations, "organizations")],
+    Organizations: [(Housing, "housing"), (Counseling, "counseling")],
+}
+
+
+def load_state_ids(Model, ids):
+    """Map each resource id to its state ids with one query."""
+    key = STATE_LINKS[Model]
+    state_ids = defaultdict(list)
+    if not ids:
+        return state_ids
+    rows = db.session.query(key, key.table.c.state_id).filter(key.in_(ids)).all()
+    for resource_id, state_id in rows:
+        state_ids[resource_id].append(state_id)
+    return state_ids
+
+
+# LRU cache of related summaries keyed by (related table, state id), plus
+# the merged lists of several states keyed by (related table, state ids). Entries
+# carry the table version they were built from and are dropped once it moves.
+STATE_CACHE_SIZE = 512
+_state_cache = OrderedDict()
+_state_cache_lock = threading.Lock()
+
+
+def load_state_resources(Related, state_ids):
+    """Map each state id to the {id, name, category} of every Related row in it.
+
+    Served from the per-state cache where possible; only states missing from
+    it are queried, all in one statement.
+    """
+    table_name = Related.__tablename__
+    version = table_version(table_name)
+    by_state = {}
+    missing = []
+    with _state_cache_lock:
+        for state_id in state_ids:
+            entry = _state_cache.get((table_name, state_id))
+            if entry and entry[0] == version:
+                _state_cache.move_to_end((table_name, state_id))
+                by_state[state_id] = entry[1]
+            else:
+                missing.append(state_id)
+    if not missing:
+        return by_state
+
+    key = STATE_LINKS[Related]
+    rows = (
+        db.session.query(
+            key.table.c.state_id, Related.id, Related.name, Related.category
+        )
+        .join(key.table, key == Related.id)
+        .filter(key.table.c.state_id.in_(missing))
+        # (state_id, resource id) order is the reverse index's own order
+        .order_by(key.table.c.state_id, key)
+        .all()
+    )
+    loaded = {state_id: [] for state_id in missing}
+    for state_id, id, name, category in rows:
+        loaded[state_id].append({"id": id, "name": name, "category": category})
+    with _state_cache_lock:
+        for state_id, summaries in loaded.items():
+            _state_cache[(table_name, state_id)] = (version, summaries)
+            _state_cache.move_to_end((table_name, state_id))
+        while len(_state_cache) > STATE_CACHE_SIZE:
+            _state_cache.popitem(last=False)
+    by_state.update(loaded)
+    return by_state
+
+
+def ordered_state_resources(Related, state_ids):
+    """Every Related summary in the given states once, in id order.
+
+    A single state's cached list already is. The merge for several states is
+    cached too, under their sorted ids and with the same version check, so
+    it is built once per change to the table rather than per request.
+    """
+    table_name = Related.__tablename__
+    version = table_version(table_name)
+    by_state = load_state_resources(Related, state_ids)
+    if len(by_state) == 1:
+        return next(iter(by_state.values()))
+    cache_key = (table_name, tuple(sorted(by_state)))
+    with _state_cache_lock:
+        entry = _state_cache.get(cache_key)
+        if entry and entry[0] == version:
+            _state_cache.move_to_end(cache_key)
+            return entry[1]
+    ordered = []
+    for summary in heapq.merge(*by_state.values(), key=operator.itemgetter("id")):
+        # rows linked to several of the states come up once per state
+        if not ordered or ordered[-1]["id"] != summary["id"]:
+            ordered.append(summary)
+    with _state_cache_lock:
+        _state_cache[cache_key] = (version, ordered)
+        _state_cache.move_to_end(cache_key)
+        while len(_state_cache) > STATE_CACHE_SIZE:
+            _state_cache.popitem(last=False)
+    return ordered
+
+
+# Columns fed to the search index. place_id and photo_url are opaque ids and
+# URLs that would match almost any short term.
+SEARCH_FIELDS = [
+    "name",
+    "address",
+    "category",
+    "keyword",
+    "phone",
+    "website",
+    "state",
+    "source",
+]
+
+# Native full-text search over SEARCH_FIELDS. MySQL gets a FULLTEXT index on
+# the table itself; SQLite gets an FTS5 shadow table kept in sync by triggers.
+def fulltext_table(Model):
+    return table(f"{Model.__tablename__}_fts", column("rowid"), column("rank"))
+
+
+def fulltext_ddl(Model, dialect):
+    name = Model.__tablename__
+    columns = ", ".join(SEARCH_FIELDS)
+    if dialect == "mysql":
+        return [f"ALTER TABLE {name} ADD FULLTEXT INDEX ft_{name}_search ({columns})"]
+    new_values = ", ".join(f"new.{c}" for c in SEARCH_FIELDS)
+    old_values = ", ".join(f"old.{c}" for c in SEARCH_FIELDS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name}_fts USING fts5("
+        f"{columns}, content='{name}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_insert AFTER INSERT ON {name} "
+        f"BEGIN INSERT INTO {name}_fts (rowid, {columns}) "
+        f"VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_delete AFTER DELETE ON {name} "
+        f"BEGIN INSERT INTO {name}_fts ({name}_fts, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_update AFTER UPDATE ON {name} "
+        f"BEGIN INSERT INTO {name}_fts ({name}_fts, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {name}_fts (rowid, {columns}) "
+        f"VALUES (new.id, {new_values}); END",
+    ]
+
+
+for _Model in (Housing, Counseling, Organizations):
+    for _dialect in ("mysql", "sqlite"):
+        for _statement in fulltext_ddl(_Model, _dialect):
+            event.listen(
+                _Model.__table__,
+                "after_create",
+                DDL(_statement).execute_if(dialect=_dialect),
+            )
+    event.listen(
+        _Model.__table__,
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {_Model.__tablename__}_fts").execute_if(
+            dialect="sqlite"
+        ),
+    )
+
+
+def ensure_fulltext_indexes():
+    """Add the full-text index to tables created before it existed."""
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        for Model in (Housing, Counseling, Organizations):
+            name = Model.__tablename__
+            if dialect == "mysql":
+                present = conn.execute(
+                    text(
+                        "SELECT COUNT(*) FROM information_schema.statistics "
+                        "WHERE table_schema = DATABASE() AND table_name = :table "
+                        "AND index_name = :index"
+                    ),
+                    {"table": name, "index": f"ft_{name}_search"},
+                ).scalar()
+                if present:
+                    continue
+            for statement in fulltext_ddl(Model, dialect):
+                conn.execute(text(statement))
+            if dialect == "sqlite":
+                # index rows that were inserted before the triggers existed
+                conn.execute(
+                    text(f"INSERT INTO {name}_fts ({name}_fts) VALUES ('rebuild')")
+                )
+
+
+def ensure_indexes():
+    """Create any declared index missing from an existing database.
+
+    create_all() only adds indexes together with new tables; this brings
+    tables created before an index was declared up to date.
+    """
+    created = []
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for tbl in db.metadata.sorted_tables:
+            if tbl.name not in existing_tables:
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(tbl.name)}
+            for index in sorted(tbl.indexes, key=lambda index: index.name):
+                if index.name not in existing:
+                    index.create(conn)
+                    created.append(index.name)
+    return created
+
+
+# One index per model, tagged with the data_version it was built from. Writes
+# made through this process are applied incrementally once committed; writes
+# from setup_db.py or the scraper trigger a rebuild on the next search.
+_search_indexes = {}
+_geo_indexes = {}
+_indexes_lock = threading.Lock()
+
+# Columns the in-memory indexes are built from
+INDEXED_FIELDS = SEARCH_FIELDS + ["lat", "lng"]
+
+
+def cached_index(indexes, Model, build):
+    version = table_version(Model.__tablename__)[1]
+    entry = indexes.get(Model)
+    if entry and entry[0] == version:
+        return entry[1]
+    with _indexes_lock:
+        entry = indexes.get(Model)
+        if entry and entry[0] == version:
+            return entry[1]
+        index = build(Model)
+        indexes[Model] = (version, index)
+        return index
+
+
+def build_search_index(Model):
+    index = SearchIndex()
+    columns = [getattr(Model, field) for field in SEARCH_FIELDS]
+    for row in db.session.query(Model.id, *columns).yield_per(1000):
+        index.add(row[0], row[1:])
+    return index
+
+
+def build_geo_index(Model):
+    index = GeoIndex()
+    query = db.session.query(Model.id, Model.lat, Model.lng, Model.category).filter(
+        Model.lat.isnot(None), Model.lng.isnot(None)
+    )
+    for id, lat, lng, category in query.yield_per(1000):
+        index.add(id, lat, lng, category)
+    return index
+
+
+def get_search_index(Model):
+    return cached_index(_search_indexes, Model, build_search_index)
+
+
+def get_geo_index(Model):
+    return cached_index(_geo_indexes, Model, build_geo_index)
+
+
+def queue_index_insert(mapper, connection, target):
+    # columns never set on a new row were inserted as NULL
+    state = inspect(target)
+    values = {field: state.dict.get(field) for field in INDEXED_FIELDS}
+    state.session.info.setdefault("index_updates", []).append(
+        (type(target), target.id, "add", values)
+    )
+
+
+def queue_index_update(mapper, connection, target):
+    state = inspect(target)
+    if any(field in state.unloaded for field in INDEXED_FIELDS):
+        values = None  # partially loaded row, rebuild instead of guessing
+    else:
+        values = {field: getattr(target, field) for field in INDEXED_FIELDS}
+    state.session.info.setdefault("index_updates", []).append(
+        (type(target), target.id, "add", values)
+    )
+
+
+def queue_index_delete(mapper, connection, target):
+    inspect(target).session.info.setdefault("index_updates", []).append(
+        (type(target), target.id, "remove", None)
+    )
+
+
+for _Model in (Housing, Counseling, Organizations):
+    event.listen(_Model, "after_insert", queue_index_insert)
+    event.listen(_Model, "after_update", queue_index_update)
+    event.listen(_Model, "after_delete", queue_index_delete)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_index_updates(session):
+    for Model, id, action, values in session.info.pop("index_updates", []):
+        search = _search_indexes.get(Model)
+        geo = _geo_indexes.get(Model)
+        if action == "remove":
+            for entry in (search, geo):
+                if entry is not None:
+                    entry[1].remove(id)
+        elif values is None:
+            _search_indexes.pop(Model, None)
+            _geo_indexes.pop(Model, None)
+        else:
+            if search is not None:
+                search[1].add(id, [values[field] for field in SEARCH_FIELDS])
+            if geo is not None:
+                geo[1].add(id, values["lat"], values["lng"], values["category"])
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_index_updates(session):
+    session.info.pop("index_updates", None)
+
+
+def clear_caches():
+    """Drop every cached result and re-read data_version on next use."""
+    global _shared_versions_polled
+    _count_cache.clear()
+    with _state_cache_lock:
+        _state_cache.clear()
+    _search_indexes.clear()
+    _geo_indexes.clear()
+    _stats_cache.clear()
+    _shared_versions_polled = None
+
+
+def load_in_state_resources(Model, rows):
+    """Build in_state_resources for a batch of rows.
+
+    Runs one query for the rows' state ids and one per related model, no
+    matter how many rows are in the batch, then fans the results out.
+    """
+    state_ids = load_state_ids(Model, list({row.id for row in rows}))
+    all_state_ids = sorted({s for ids in state_ids.values() for s in ids})
+    related = [
+        (name, load_state_resources(Related, all_state_ids))
+        for Related, name in RELATED_RESOURCES[Model]
+    ]
+    in_state = {}
+    for row in rows:
+        resources = {}
+        for name, by_state in related:
+            found = {}
+            for state_id in state_ids.get(row.id, []):
+                for summary in by_state.get(state_id, []):
+                    found.setdefault(summary["id"], summary)
+            resources[name] = sorted(found.values(), key=lambda s: s["id"])
+        in_state[row.id] = resources
+    return in_state
+
+
+# Detail routes page each related list with related[<name>][limit],
+# related[<name>][offset] and related[<name>][sort].
+RELATED_DEFAULT_LIMIT = 50
+RELATED_MAX_LIMIT = 500
+RELATED_SORTS = ("id", "rating", "-rating", "distance")
+
+
+def get_related_params(Model):
+    """Map each relation of Model to its (limit, offset, sort)."""
+    args = {name: {} for _, name in RELATED_RESOURCES[Model]}
+    for key, value in request.args.items():
+        if not key.startswith("related["):
+            continue
+        name, _, option = key[8:-1].partition("][")
+        if not key.endswith("]") or name not in args:
+            raise InvalidQuery(f"Unknown relation in {key}")
+        if option not in ("limit", "offset", "sort"):
+            raise InvalidQuery(f"Unknown option in {key}")
+        args[name][option] = value
+    params = {}
+    for name, options in args.items():
+        try:
+            limit = int(options.get("limit", RELATED_DEFAULT_LIMIT))
+            offset = int(options.get("offset", 0))
+        except ValueError:
+            raise InvalidQuery(f"related[{name}] limit and offset must be integers")
+        if not 0 <= limit <= RELATED_MAX_LIMIT or offset < 0:
+            raise InvalidQuery(
+                f"related[{name}][limit] must be between 0 and {RELATED_MAX_LIMIT}"
+                " and the offset not negative"
+            )
+        sort = options.get("sort", "id")
+        if sort not in RELATED_SORTS:
+            raise InvalidQuery(
+                f"related[{name}][sort] must be one of {', '.join(RELATED_SORTS)}"
+            )
+        params[name] = (limit, offset, sort)
+    return params
+
+
+def count_related(relations, state_ids):
+    """Total rows per relation name in the given states, in one query."""
+    branches = [
+        select(literal(name).label("relation"), func.count(distinct(key)))
+        .where(key.table.c.state_id.in_(state_ids))
+        for name, key in relations
+    ]
+    return dict(db.session.execute(union_all(*branches)).all())
+
+
+def load_related_page(Related, state_ids, row, limit, offset, sort):
+    """One page of Related summaries in the given states, ordered in SQL."""
+    key = STATE_LINKS[Related]
+    # a semi-join, so rows linked to several of the states appear once
+    in_states = select(key).where(key.table.c.state_id.in_(state_ids))
+    query = db.session.query(
+        Related.id, Related.name, Related.category, Related.lat, Related.lng
+    ).filter(Related.id.in_(in_states))
+    with_distance = sort == "distance" and row.lat is not None and row.lng is not None
+    if with_distance:
+        # equirectangular distance orders like haversine at state scale
+        scale = math.cos(math.radians(row.lat))
+        dlat = Related.lat - row.lat
+        dlng = (Related.lng - row.lng) * scale
+        query = query.order_by(
+            Related.lat.is_(None), dlat * dlat + dlng * dlng, Related.id
+        )
+    elif sort in ("rating", "-rating"):
+        query = query.order_by(*sort_columns(Related, "rating", sort == "-rating"))
+    else:
+        query = query.order_by(Related.id)
+    summaries = []
+    for id, name, category, lat, lng in query.limit(limit).offset(offset):
+        summary = {"id": id, "name": name, "category": category}
+        if with_distance:
+            summary["distance_km"] = (
+                round(haversine_km(row.lat, row.lng, lat, lng), 3)
+                if lat is not None and lng is not None
+                else None
+            )
+        summaries.append(summary)
+    return summaries
+
+
+def load_related_lists(Model, row):
+    """Bounded in_state_resources for one row plus the total per relation.
+
+    Lists in id order are sliced from the cached, already ordered list of
+    the row's states, which also gives their totals. Other orders run one
+    LIMIT/OFFSET query per relation and share one aggregate query for their
+    totals.
+    """
+    params = get_related_params(Model)
+    state_ids = load_state_ids(Model, [row.id]).get(row.id, [])
+    in_state, totals, uncounted = {}, {}, []
+    for Related, name in RELATED_RESOURCES[Model]:
+        limit, offset, sort = params[name]
+        if not state_ids:
+            in_state[name], totals[name] = [], 0
+        elif sort == "id":
+            ordered = ordered_state_resources(Related, state_ids)
+            in_state[name] = ordered[offset : offset + limit]
+            totals[name] = len(ordered)
+        else:
+            in_state[name] = load_related_page(
+                Related, state_ids, row, limit, offset, sort
+            )
+            uncounted.append((name, STATE_LINKS[Related]))
+    if uncounted:
+        totals.update(count_related(uncounted, state_ids))
+    return in_state, totals
+
+
+# ---- CONDITIONAL GET ----
+# Every API response is built from these tables, so their versions are enough
+# to tell whether a response a client already holds is still current.
+RESOURCE_TABLES = ["housing", "counseling", "organizations", "state"]
+
+
+def response_validators():
+    """Weak ETag and Last-Modified for the current request's response."""
+    versions = [table_version(name) for name in RESOURCE_TABLES]
+    fingerprint = json.dumps(
+        [
+            versions,
+            request.full_path,
+            app.config["SEARCH_BACKEND"],
+            app.config["LIST_SEARCH_BACKEND"],
+        ]
+    )
+    etag = hashlib.sha1(fingerprint.encode()).hexdigest()
+    modified = [table_modified(name) for name in RESOURCE_TABLES]
+    last_modified = max((m for m in modified if m), default=None)
+    if last_modified:
+        last_modified = last_modified.replace(microsecond=0)
+    return etag, last_modified
+
+
+def is_conditional_get():
+    return (
+        request.method == "GET"
+        and request.path.startswith("/api/")
+        and request.path != "/api/health"
+    )
+
+
+@app.before_request
+def answer_not_modified():
+    """Answer 304 before any query runs when the client's copy is current."""
+    if not is_conditional_get():
+        return None
+    # taken before the handler runs, so a write racing the request can only
+    # make the response look older than it is, never newer
+    g.validators = etag, last_modified = response_validators()
+    if not (request.if_none_match or request.if_modified_since):
+        return None
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = bool(last_modified) and last_modified <= request.if_modified_since
+    if not fresh:
+        return None
+    response = app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+
+@app.after_request
+def add_validators(response):
+    if response.status_code == 200 and "validators" in g:
+        etag, last_modified = g.validators
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified
+        # caches may keep the response but must revalidate before reuse
+        response.headers.setdefault("Cache-Control", "no-cache")
+    return response
+
+
+# ---- COMPRESSION ----
+# Bodies smaller than this are sent as they are
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = {"application/json", "application/x-ndjson"}
+
+
+def negotiate_encoding():
+    offered = ["br", "gzip"] if brotli else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_chunks(chunks, encoding):
+    """Compress an iterable of chunks, flushing after each one so streamed
+    pages reach the client as they are produced."""
+    if encoding == "br":
+        compressor = brotli.Compressor()
+        compress, flush = compressor.process, compressor.flush
+        finish = compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        compress = compressor.compress
+        flush = functools.partial(compressor.flush, zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+@app.after_request
+def compress_response(response):
+    if (
+        response.status_code != 200
+        or response.mimetype not in COMPRESS_MIMETYPES
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_chunks(response.response, encoding)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(b"".join(compress_chunks([data], encoding)))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
 @app.route("/api/health", methods=["GET"])
 def health():
     return {"ok": True}, 200
@@ -210,165 +1173,35 @@ def index():
     return "Backend is working!"
 
 
-@app.route("/api/housing-resources/<int:id>", methods=["GET"])
-def get_housing_by_id(id):
-    housing = db.session.get(Housing, id)
-    if not housing:
+def get_resource_by_id(Model, id):
+    fields = get_fieldset(Model)
+    # related lists ordered by distance are measured from the row's lat/lng
+    options = fieldset_options(Model, fields, ["lat", "lng"])
+    resource = db.session.get(Model, id, options=options)
+    if not resource:
         return {"error": "Not found"}, 404
 
-    state_ids = [s.id for s in housing.states]
-    if not state_ids:
-        state_ids = [-1]  # no match
-    related_counseling = (
-        db.session.query(Counseling.id, Counseling.name, Counseling.category)
-        .join(counseling_state)
-        .filter(counseling_state.c.state_id.in_(state_ids))
-        .all()
-    )
-    related_organizations = (
-        db.session.query(Organizations.id, Organizations.name, Organizations.category)
-        .join(organization_state)
-        .filter(organization_state.c.state_id.in_(state_ids))
-        .all()
-    )
+    if not include_in_state_resources(fields):
+        return SERIALIZERS[Model].item(resource, None, fields)
+    in_state, totals = load_related_lists(Model, resource)
+    item = SERIALIZERS[Model].item(resource, in_state, fields)
+    item["in_state_counts"] = totals
+    return item
 
-    """related_counseling = Counseling.query.filter_by(state=housing.state).all()
-    related_organizations = Organizations.query.filter_by(state=housing.state).all()"""
-    return {
-        "id": housing.id,
-        "place_id": housing.place_id,
-        "name": housing.name,
-        "address": housing.address,
-        "lat": housing.lat,
-        "lng": housing.lng,
-        "rating": housing.rating,
-        "types": housing.types,
-        "category": housing.category,
-        "keyword": housing.keyword,
-        "phone": housing.phone,
-        "website": housing.website,
-        "photo_url": housing.photo_url,
-        "state": housing.state,
-        "source": housing.source,
-        "retrieved_at": housing.retrieved_at.isoformat(),
-        "in_state_resources": {
-            "counseling": [
-                {"id": c.id, "name": c.name, "category": c.category}
-                for c in related_counseling
-            ],
-            "organizations": [
-                {"id": o.id, "name": o.name, "category": o.category}
-                for o in related_organizations
-            ],
-        },
-    }
+
+@app.route("/api/housing-resources/<int:id>", methods=["GET"])
+def get_housing_by_id(id):
+    return get_resource_by_id(Housing, id)
 
 
 @app.route("/api/counseling/<int:id>", methods=["GET"])
 def get_counseling_by_id(id):
-    counseling = db.session.get(Counseling, id)
-    if not counseling:
-        return {"error": "Not found"}, 404
-
-    state_ids = [s.id for s in counseling.states]
-    if not state_ids:
-        state_ids = [-1]  # no match
-    related_housing = (
-        db.session.query(Housing.id, Housing.name, Housing.category)
-        .join(housing_state)
-        .filter(housing_state.c.state_id.in_(state_ids))
-        .all()
-    )
-    related_organizations = (
-        db.session.query(Organizations.id, Organizations.name, Organizations.category)
-        .join(organization_state)
-        .filter(organization_state.c.state_id.in_(state_ids))
-        .all()
-    )
-
-    """related_housing = Housing.query.filter_by(state=counseling.state).all()
-    related_organizations = Organizations.query.filter_by(state=counseling.state).all()"""
-    return {
-        "id": counseling.id,
-        "place_id": counseling.place_id,
-        "name": counseling.name,
-        "address": counseling.address,
-        "lat": counseling.lat,
-        "lng": counseling.lng,
-        "rating": counseling.rating,
-        "types": counseling.types,
-        "category": counseling.category,
-        "keyword": counseling.keyword,
-        "phone": counseling.phone,
-        "website": counseling.website,
-        "photo_url": counseling.photo_url,
-        "state": counseling.state,
-        "source": counseling.source,
-        "retrieved_at": counseling.retrieved_at.isoformat(),
-        "in_state_resources": {
-            "housing": [
-                {"id": h.id, "name": h.name, "category": h.category}
-                for h in related_housing
-            ],
-            "organizations": [
-                {"id": o.id, "name": o.name, "category": o.category}
-                for o in related_organizations
-            ],
-        },
-    }
+    return get_resource_by_id(Counseling, id)
 
 
 @app.route("/api/organizations/<int:id>", methods=["GET"])
 def get_organizations_by_id(id):
-    organization = db.session.get(Organizations, id)
-    if not organization:
-        return {"error": "Not found"}, 404
-
-    state_ids = [s.id for s in organization.states]
-    if not state_ids:
-        state_ids = [-1]  # no match
-    related_housing = (
-        db.session.query(Housing.id, Housing.name, Housing.category)
-        .join(housing_state)
-        .filter(housing_state.c.state_id.in_(state_ids))
-        .all()
-    )
-    related_counseling = (
-        db.session.query(Counseling.id, Counseling.name, Counseling.category)
-        .join(counseling_state)
-        .filter(counseling_state.c.state_id.in_(state_ids))
-        .all()
-    )
-    """related_housing = Housing.query.filter_by(state=organization.state).all()
-    related_counseling = Counseling.query.filter_by(state=organization.state).all()"""
-    return {
-        "id": organization.id,
-        "place_id": organization.place_id,
-        "name": organization.name,
-        "address": organization.address,
-        "lat": organization.lat,
-        "lng": organization.lng,
-        "rating": organization.rating,
-        "types": organization.types,
-        "category": organization.category,
-        "keyword": organization.keyword,
-        "phone": organization.phone,
-        "website": organization.website,
-        "photo_url": organization.photo_url,
-        "state": organization.state,
-        "source": organization.source,
-        "retrieved_at": organization.retrieved_at.isoformat(),
-        "in_state_resources": {
-            "housing": [
-                {"id": h.id, "name": h.name, "category": h.category}
-                for h in related_housing
-            ],
-            "counseling": [
-                {"id": c.id, "name": c.name, "category": c.category}
-                for c in related_counseling
-            ],
-        },
-    }
+    return get_resource_by_id(Organizations, id)
 
 
 # Helper function to generate links
@@ -384,109 +1217,406 @@ def make_page_link(page, page_size, name):
     return f"{BASE_URL}{relative}"
 
 
-def serialize_model(model, related_a, related_b, a_name, b_name):
+def make_page_links(self_link, page_number, page_size, total_items, name):
+    total_pages = (total_items + page_size - 1) // page_size
     return {
-        "id": model.id,
-        "place_id": model.place_id,
-        "name": model.name,
-        "address": model.address,
-        "lat": model.lat,
-        "lng": model.lng,
-        "rating": model.rating,
-        "types": model.types,
-        "category": model.category,
-        "keyword": model.keyword,
-        "phone": model.phone,
-        "website": model.website,
-        "photo_url": model.photo_url,
-        "state": model.state,
-        "source": model.source,
-        "retrieved_at": model.retrieved_at.isoformat(),
-        "in_state_resources": {
-            a_name: [
-                {"id": a.id, "name": a.name, "category": a.category} for a in related_a
-            ],
-            b_name: [
-                {"id": b.id, "name": b.name, "category": b.category} for b in related_b
-            ],
-        },
+        "self": self_link,
+        "first": make_page_link(1, page_size, name),
+        "last": make_page_link(total_pages, page_size, name),
+        "prev": (
+            make_page_link(page_number - 1, page_size, name)
+            if page_number > 1
+            else None
+        ),
+        "next": (
+            make_page_link(page_number + 1, page_size, name)
+            if page_number < total_pages
+            else None
+        ),
     }
 
 
-def as_resource(item, resource_type):
+def get_page_params():
+    page_number = max(get_int_param("page[number]", 1), 1)
+    # a multi-get returns every id asked for on one page by default
+    ids = requested_ids()
+    default_size = len(ids) if ids else 3
+    page_size = max(get_int_param("page[size]", default_size), 1)
+    return page_number, page_size
+
+
+def get_int_param(name, default):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidQuery(f"{name} must be an integer")
+
+
+def get_float_param(name, low, high, default=None):
+    value = request.args.get(name)
+    if value is None or value == "":
+        if default is None:
+            raise InvalidQuery(f"{name} is required")
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise InvalidQuery(f"{name} must be a number")
+    if not low <= number <= high:
+        raise InvalidQuery(f"{name} must be between {low} and {high}")
+    return number
+
+
+def paginate_query(query, page_number, page_size):
+    # LIMIT/OFFSET in SQL so only the requested page is ever loaded
+    return query.limit(page_size).offset((page_number - 1) * page_size)
+
+
+class InvalidQuery(Exception):
+    """Raised for malformed query parameters, answered with a 400."""
+
+
+@app.errorhandler(InvalidQuery)
+def handle_invalid_query(error):
+    return jsonify({"error": str(error)}), 400
+
+
+def encode_cursor(field, row, direction):
+    value = getattr(row, field)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([field, value, row.id, direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, Model):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        field, value, last_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        col = Model.__table__.columns[field]
+        if value is not None and isinstance(col.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError, KeyError):
+        raise InvalidQuery("Invalid page cursor")
+    if direction not in ("next", "prev"):
+        raise InvalidQuery("Invalid page cursor")
+    return field, value, int(last_id), direction
+
+
+def keyset_filter(Model, field, value, last_id, descending):
+    # Rows strictly after (value, last_id) in the sort order. Both MySQL and
+    # SQLite put NULLs first when ascending and last when descending.
+    if field == "id":
+        return Model.id < last_id if descending else Model.id > last_id
+    col = getattr(Model, field)
+    if descending:
+        if value is None:
+            return and_(col.is_(None), Model.id < last_id)
+        return or_(
+            col < value,
+            and_(col == value, Model.id < last_id),
+            col.is_(None),
+        )
+    if value is None:
+        return or_(and_(col.is_(None), Model.id > last_id), col.isnot(None))
+    return or_(col > value, and_(col == value, Model.id > last_id))
+
+
+def make_cursor_link(name, page_size, token):
+    # keep filters, search and sort so the cursor stays valid on the next page
+    args = {k: v for k, v in request.args.items() if not k.startswith("page[")}
+    args["page[size]"] = page_size
+    args["page[cursor]"] = token
+    return f"{BASE_URL}{url_for(name, **args)}"
+
+
+def is_keyset_request():
+    return "page[cursor]" in request.args or "page[after]" in request.args
+
+
+def keyset_query(query, Model):
+    """Apply page[cursor] to query.
+
+    Returns the ordered query, the sort field, the cursor token and whether
+    the cursor walks backwards.
+    """
+    field, descending = get_sort(request, Model)
+    token = request.args.get("page[cursor]") or request.args.get("page[after]")
+    backward = False
+    if token:
+        token_field, value, last_id, direction = decode_cursor(token, Model)
+        if token_field != field:
+            raise InvalidQuery("Page cursor does not match the requested sort")
+        backward = direction == "prev"
+        # walking backwards is walking forwards in the reversed order
+        query = query.filter(
+            keyset_filter(Model, field, value, last_id, descending != backward)
+        )
+    query = query.order_by(None).order_by(
+        *sort_columns(Model, field, descending != backward)
+    )
+    return query, field, token, backward
+
+
+def keyset_links(
+    self_link, name, page_size, field, first, last, token, backward, has_more
+):
+    has_next = has_more if not backward else bool(token)
+    has_prev = bool(token) if not backward else has_more
     return {
-        "id": str(item["id"]),
-        "type": resource_type,
-        "attributes": {k: v for k, v in item.items() if k != "id"},
+        "self": self_link,
+        "first": make_cursor_link(name, page_size, ""),
+        "last": None,
+        "prev": (
+            make_cursor_link(name, page_size, encode_cursor(field, first, "prev"))
+            if first is not None and has_prev
+            else None
+        ),
+        "next": (
+            make_cursor_link(name, page_size, encode_cursor(field, last, "next"))
+            if last is not None and has_next
+            else None
+        ),
     }
 
 
-import re
+def fetch_keyset_page(query, Model, page_size, self_link, name):
+    query, field, token, backward = keyset_query(query, Model)
+    # one extra row tells us whether another page exists
+    rows = query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backward:
+        rows.reverse()
+    first, last = (rows[0], rows[-1]) if rows else (None, None)
+    links = keyset_links(
+        self_link, name, page_size, field, first, last, token, backward, has_more
+    )
+    return rows, links
 
 
-def compute_matches(data_dict, search_query, terms):
-    matches = {}
-    if not (search_query or terms):
-        return matches
+def fetch_page(query, Model, self_link, name):
+    """Load one page of rows plus its links and the total row count.
 
-    # escape search for regex
-    phrase = re.escape(search_query) if search_query else None
+    page[cursor] (or page[after]) switches from page[number] offsets to
+    keyset paging on the (sort column, id) of the last row seen.
+    """
+    page_number, page_size = get_page_params()
+    total_items = count_results(query, Model)
+    if not total_items:
+        return [], {}, 0
+    if is_keyset_request():
+        rows, links = fetch_keyset_page(query, Model, page_size, self_link, name)
+    else:
+        rows = paginate_query(query, page_number, page_size).all()
+        links = make_page_links(self_link, page_number, page_size, total_items, name)
+    return rows, links, total_items
 
-    def scan_field(path, text):
-        found = []
-        text = str(text)
 
-        # phrase match
-        if phrase:
-            for m in re.finditer(phrase, text, flags=re.IGNORECASE):
-                found.append(
-                    {
-                        "term": search_query,
-                        "indices": [(m.start(), m.end())],
-                    }
-                )
+# Cached totals for meta.total, keyed by table + the args that change the
+# result set (filters and search, not paging or sorting).
+COUNT_CACHE_TTL = 60  # seconds
+COUNT_CACHE_SIZE = 1024
+_count_cache = {}
 
-        # individual term matches (skip if same as search_query)
-        for term in terms:
-            if search_query and term.lower() == search_query.lower():
-                continue
-            t = re.escape(term)
-            indices = [
-                (m.start(), m.end()) for m in re.finditer(t, text, flags=re.IGNORECASE)
-            ]
-            if indices:
-                found.append(
-                    {
-                        "term": term,
-                        "indices": indices,
-                    }
-                )
 
-        if found:
-            # deduplicate by term + indices
-            unique_found = []
-            seen = set()
-            for item in found:
-                key = (item["term"].lower(), tuple(item["indices"]))
-                if key not in seen:
-                    seen.add(key)
-                    unique_found.append(item)
-            matches[path] = unique_found
-
-    # recursive traversal
-    def walk(path, value):
-        if isinstance(value, str):
-            scan_field(path, value)
-        elif isinstance(value, list):
-            for i, item in enumerate(value):
-                walk(f"{path}[{i}]", item)
-        elif isinstance(value, dict):
-            for k, v in value.items():
-                walk(f"{path}.{k}", v)
-        # numbers, None, bool, etc. are ignored
-
-    walk("", data_dict)
-    return matches
+def count_results(query, Model):
+    args = tuple(
+        sorted(
+            (k, v)
+            for k, v in request.args.items()
+            if (k.startswith("filter[") and k.endswith("]")) or k == "search"
+        )
+    )
+    key = (Model.__tablename__, table_version(Model.__tablename__), args)
+    cached = _count_cache.get(key)
+    if cached and time.monotonic() - cached[1] < COUNT_CACHE_TTL:
+        return cached[0]
+    # ORDER BY is useless for a count; DISTINCT guards against join fan-out
+    total = (
+        query.order_by(None)
+        .with_entities(func.count(distinct(Model.id)))
+        .scalar()
+    )
+    if len(_count_cache) >= COUNT_CACHE_SIZE:
+        _count_cache.clear()
+    _count_cache[key] = (total, time.monotonic())
+    return total
+
+
+# Attributes every resource model exposes, in response order
+RESOURCE_FIELDS = [
+    "id",
+    "place_id",
+    "name",
+    "address",
+    "lat",
+    "lng",
+    "rating",
+    "types",
+    "category",
+    "keyword",
+    "phone",
+    "website",
+    "photo_url",
+    "state",
+    "source",
+    "retrieved_at",
+]
+
+
+def get_fieldset(Model):
+    """Attributes requested with fields[<type>], or None for all of them."""
+    value = request.args.get(f"fields[{Model.__tablename__}]")
+    if value is None:
+        return None
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [
+        f for f in fields if f not in RESOURCE_FIELDS and f != "in_state_resources"
+    ]
+    if unknown:
+        raise InvalidQuery(
+            f"Unknown field(s) for {Model.__tablename__}: {', '.join(unknown)}"
+        )
+    return fields
+
+
+def fieldset_options(Model, fields, extra=()):
+    """load_only() for the fieldset so unused columns are never selected."""
+    if fields is None:
+        return []
+    names = ["id"] + [f for f in fields if f in RESOURCE_FIELDS] + list(extra)
+    return [load_only(*[getattr(Model, name) for name in dict.fromkeys(names)])]
+
+
+def include_in_state_resources(fields):
+    if "in_state_resources" in request.args.get("exclude", "").split(","):
+        return False
+    if "in_state_resources" in request.args.get("include", "").split(","):
+        return True
+    return fields is None or "in_state_resources" in fields
+
+
+# Column accessors are planned once per model, not per row
+SERIALIZERS = {
+    Model: ResourceSerializer(Model, RESOURCE_FIELDS)
+    for Model in (Housing, Counseling, Organizations)
+}
+
+
+def get_highlight_fields():
+    """Top-level attributes listed in highlight=, or None to scan them all."""
+    value = request.args.get("highlight")
+    if not value:
+        return None
+    return {f.strip() for f in value.split(",") if f.strip()}
+
+
+# ---- VIEWPORTS ----
+# Above this many rows in a box, filter[bbox] uses a range predicate rather
+# than an id list from the geo index
+BBOX_MAX_IDS = 5000
+# cluster=<zoom> returns raw rows up to this many results, clusters above it
+CLUSTER_MIN_POINTS = 200
+CLUSTER_MAX_ZOOM = 22
+# Grid cells per 256px map tile edge, so a cluster covers about 64px
+CLUSTER_CELLS_PER_TILE = 4
+CLUSTER_MAX_CELLS = 2048
+
+
+def parse_bbox(value):
+    """Parse minLng,minLat,maxLng,maxLat into (min_lat, min_lng, max_lat, max_lng)."""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in value.split(","))
+    except ValueError:
+        raise InvalidQuery("filter[bbox] must be minLng,minLat,maxLng,maxLat")
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+        raise InvalidQuery("filter[bbox] is not a valid box")
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def bbox_filter(Model, bbox):
+    ids = []
+    for doc_id, *_ in get_geo_index(Model).within(*bbox):
+        ids.append(doc_id)
+        if len(ids) > BBOX_MAX_IDS:
+            # a large share of the table, let the database scan the range
+            min_lat, min_lng, max_lat, max_lng = bbox
+            return and_(
+                Model.lat.between(min_lat, max_lat),
+                Model.lng.between(min_lng, max_lng),
+            )
+    return Model.id.in_(ids)
+
+
+def render_clusters(query, Model, self_link):
+    """Grid clusters for cluster=<zoom>, or None when raw rows are few enough."""
+    zoom = int(get_float_param("cluster", 0, CLUSTER_MAX_ZOOM))
+    total_items = count_results(query, Model)
+    if total_items <= CLUSTER_MIN_POINTS:
+        return None
+    bbox_value = request.args.get("filter[bbox]")
+    bbox = parse_bbox(bbox_value) if bbox_value else (-90.0, -180.0, 90.0, 180.0)
+    min_lat, min_lng, max_lat, max_lng = bbox
+    cell_deg = 360 / 2**zoom / CLUSTER_CELLS_PER_TILE
+    # a box much larger than the screen at this zoom gets coarser cells
+    while (max_lat - min_lat) * (max_lng - min_lng) / cell_deg**2 > CLUSTER_MAX_CELLS:
+        cell_deg *= 2
+    keep = None
+    if any(
+        (k.startswith("filter[") and k != "filter[bbox]") or k == "search"
+        for k in request.args
+    ):
+        # other filters apply too, only rows the query matches count
+        keep = {id for (id,) in query.order_by(None).with_entities(Model.id)}
+    clusters = get_geo_index(Model).clusters(*bbox, cell_deg, keep)
+    data = [
+        {
+            "id": f"{zoom}/{row}/{col}",
+            "type": "clusters",
+            "attributes": {
+                "count": count,
+                "lat": lat,
+                "lng": lng,
+                "category": category,
+            },
+        }
+        for (row, col), (count, lat, lng, category) in sorted(clusters.items())
+    ]
+    response = {
+        "data": data,
+        "jsonapi": {"version": "1.0"},
+        "links": {"self": self_link},
+        "meta": {"total": total_items, "clusters": len(data), "cell_deg": cell_deg},
+    }
+    return jsonify(response)
+
+
+# filter[id] fetches at most this many rows by id in one request
+ID_FILTER_MAX = 100
+
+
+def requested_ids():
+    """The ids in filter[id]=1,5,9 in request order, duplicates dropped.
+
+    Returns None when the filter is absent.
+    """
+    value = request.args.get("filter[id]")
+    if value is None:
+        return None
+    try:
+        ids = [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise InvalidQuery("filter[id] must be a comma-separated list of ids")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise InvalidQuery("filter[id] must name at least one id")
+    if len(ids) > ID_FILTER_MAX:
+        raise InvalidQuery(f"filter[id] accepts at most {ID_FILTER_MAX} ids")
+    return ids
 
 
 def apply_query_options(query, request, Model):
@@ -499,11 +1629,14 @@ def apply_query_options(query, request, Model):
                 query = query.join(Model.states).filter(State.name.in_(states))
             elif field == "types":
                 types_list = [t.strip() for t in value.split(",")]
-                query = query.filter(
-                    or_(
-                        *[func.JSON_CONTAINS(Model.types, f'"{t}"') for t in types_list]
-                    )
+                # semi-join through the indexed type links
+                key = TYPE_LINKS[Model]
+                typed = (
+                    select(key)
+                    .join(ResourceType, ResourceType.id == key.table.c.type_id)
+                    .where(ResourceType.name.in_(types_list))
                 )
+                query = query.filter(Model.id.in_(typed))
             elif field == "keyword":
                 value = value.strip()
                 # Check if it looks like a list: [item1, item2, ...]
@@ -522,6 +1655,10 @@ def apply_query_options(query, request, Model):
                     query = query.filter(
                         or_(*[Model.keyword == t for t in matched_keywords])
                     )
+            elif field == "bbox":
+                query = query.filter(bbox_filter(Model, parse_bbox(value)))
+            elif field == "id":
+                query = query.filter(Model.id.in_(requested_ids()))
             elif hasattr(Model, field):
                 column = getattr(Model, field)
                 # Apply case-insensitive partial match for strings
@@ -532,7 +1669,12 @@ def apply_query_options(query, request, Model):
 
     # ---- SEARCH ----
     search_query = request.args.get("search")
-    if search_query:
+    relevance = None
+    if search_query and app.config["LIST_SEARCH_BACKEND"] == "fulltext":
+        query, relevance = apply_fulltext_search(
+            query, Model, search_query, search_terms(Model, search_query)
+        )
+    elif search_query:
         # Split into individual terms
         terms = [
             term.strip()
@@ -540,13 +1682,9 @@ def apply_query_options(query, request, Model):
             if term.strip() and term.lower() not in IGNORE_WORDS[Model.__name__]
         ]
         full_phrase = search_query.strip()
-        # Collect all text-like columns
-        text_columns = [
-            column
-            for column in Model.__table__.columns
-            if "char" in str(column.type).lower() or "text" in str(column.type).lower()
-        ]
-        # Build filters: full phrase match gets higher weight, individual terms get lower
+        text_columns = text_columns_of(Model)
+        # Build filters: full phrase match gets higher weight, individual terms
+        # get lower
         search_filters = []
         for column in text_columns:
             # Full phrase match
@@ -559,381 +1697,681 @@ def apply_query_options(query, request, Model):
             query = query.filter(or_(*search_filters))
 
     # ---- SORTING ----
+    field, reverse = get_sort(request, Model)
+    if relevance is not None and not request.args.get("sort"):
+        # best matches first unless the client asked for an order
+        query = query.order_by(desc(relevance), asc(Model.id))
+    elif "filter[id]" in request.args and not request.args.get("sort"):
+        # rows come back in the order their ids were asked for
+        ids = requested_ids()
+        position = case({id: i for i, id in enumerate(ids)}, value=Model.id)
+        query = query.order_by(position, asc(Model.id))
+    else:
+        query = query.order_by(*sort_columns(Model, field, reverse))
+    return query
+
+
+def fulltext_query(search_query, terms, dialect):
+    """Translate a search into a MySQL boolean-mode or FTS5 MATCH string.
+
+    The phrase is matched as a phrase and each term as a prefix. Only
+    [a-z0-9] tokens survive, so user input cannot inject MATCH syntax.
+    """
+    phrase_tokens = tokenize(search_query)
+    # every term may be an ignored word, the phrase still has to match then
+    tokens = [token for term in terms for token in tokenize(term)] or phrase_tokens
+    if dialect == "mysql":
+        parts = [f"{token}*" for token in tokens]
+        if len(phrase_tokens) > 1:
+            parts.insert(0, '"' + " ".join(phrase_tokens) + '"')
+        return " ".join(parts)
+    parts = [f'"{token}"*' for token in tokens]
+    if len(phrase_tokens) > 1:
+        parts.insert(0, '"' + " ".join(phrase_tokens) + '"')
+    return " OR ".join(parts)
+
+
+def apply_fulltext_search(query, Model, search_query, terms):
+    """Filter query with the native full-text index.
+
+    Returns the filtered query and a relevance expression (higher is better).
+    """
+    dialect = db.engine.dialect.name
+    against = fulltext_query(search_query, terms, dialect)
+    if not against:
+        return query.filter(false()), literal(0)
+    if dialect == "mysql":
+        relevance = mysql_match(
+            *[getattr(Model, field) for field in SEARCH_FIELDS], against=against
+        ).in_boolean_mode()
+        return query.filter(relevance), relevance
+    fts = fulltext_table(Model)
+    query = query.join(fts, fts.c.rowid == Model.id).filter(
+        literal_column(fts.name).op("MATCH")(against)
+    )
+    # FTS5 rank is bm25(), where more negative means more relevant
+    return query, -fts.c.rank
+
+
+def get_sort(request, Model):
     sort_value = request.args.get("sort")
     if sort_value:
         reverse = sort_value.startswith("-")
         field = sort_value.lstrip("-")
-        if hasattr(Model, field):
-            column = getattr(Model, field)
-            query = query.order_by(desc(column) if reverse else asc(column))
-    else:
-        # Default order if nothing specified
-        if hasattr(Model, "id"):
-            query = query.order_by(asc(Model.id))
-    return query
+        if field in Model.__table__.columns:
+            return field, reverse
+    # Default order if nothing specified
+    return "id", False
 
 
-@app.route("/api/housing", methods=["GET"])
-def get_all_housing():
-    query = db.session.query(Housing)
-    housing_return = apply_query_options(query, request, Housing)
-    all_housing = housing_return.all()
+def sort_columns(Model, field, reverse):
+    order = desc if reverse else asc
+    if field == "id":
+        return [order(Model.id)]
+    # id breaks ties so the order is total, which keyset paging relies on
+    return [order(getattr(Model, field)), order(Model.id)]
+
+
+# Pages at least this large are streamed instead of built in memory
+STREAM_PAGE_SIZE = 100
+# Rows serialized per round of related-resource loading
+ROW_BATCH_SIZE = 50
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def resource_items(Model, rows, fields):
+    """Yield a JSON:API resource per row, loading related lists per batch."""
     search_query = request.args.get("search", "").strip()
     terms = [t.strip() for t in search_query.split() if t.strip()]
-    housing_return = []
-    if not all_housing:
-        return {"error": "Not found"}, 404
-    for housing in all_housing:
-        state_ids = [s.id for s in housing.states]
-        if not state_ids:
-            state_ids = [-1]  # no match
-        related_counseling = (
-            db.session.query(Counseling.id, Counseling.name, Counseling.category)
-            .join(counseling_state)
-            .filter(counseling_state.c.state_id.in_(state_ids))
-            .all()
-        )
-        related_organizations = (
-            db.session.query(
-                Organizations.id, Organizations.name, Organizations.category
+    # patterns are compiled once and reused for every row on the page
+    highlighter = Highlighter(search_query, terms)
+    highlight_fields = get_highlight_fields()
+    with_related = include_in_state_resources(fields)
+    serializer = SERIALIZERS[Model]
+    for batch in batched(rows, ROW_BATCH_SIZE):
+        in_state = load_in_state_resources(Model, batch) if with_related else {}
+        for row in batch:
+            resource = serializer.resource(row, in_state.get(row.id), fields)
+            # Add matches metadata
+            attributes = resource["attributes"]
+            attributes["matches"] = highlighter.matches(attributes, highlight_fields)
+            yield resource
+
+
+def stream_rows(query, batch_size=ROW_BATCH_SIZE):
+    """Yield ORM rows from a server-side cursor.
+
+    The cursor runs on a session of its own, so related-resource queries can
+    still go through db.session while it is open.
+    """
+    with Session(db.engine) as session:
+        statement = query.statement.execution_options(yield_per=batch_size)
+        yield from session.execute(statement).scalars()
+
+
+def stream_list(query, Model, fields, self_link, name, total_items):
+    """Stream a list page: data items first, then links and meta."""
+    page_number, page_size = get_page_params()
+    keyset = is_keyset_request()
+    if keyset:
+        query, field, token, _ = keyset_query(query, Model)
+        query = query.limit(page_size + 1)
+    else:
+        query = paginate_query(query, page_number, page_size)
+
+    def generate():
+        rows = stream_rows(query)
+        page = []  # first and last row seen, for the keyset links
+
+        def page_rows():
+            for row in itertools.islice(rows, page_size):
+                page[1:] = [row]
+                yield row
+
+        yield '{"data":['
+        separator = ""
+        items = resource_items(Model, page_rows(), fields)
+        for batch in batched(items, ROW_BATCH_SIZE):
+            yield separator + ",".join(app.json.dumps(item) for item in batch)
+            separator = ","
+        if keyset:
+            first, last = (page[0], page[-1]) if page else (None, None)
+            has_more = next(rows, None) is not None
+            links = keyset_links(
+                self_link, name, page_size, field, first, last, token, False, has_more
             )
-            .join(organization_state)
-            .filter(organization_state.c.state_id.in_(state_ids))
-            .all()
-        )
-        item = serialize_model(
-            housing,
-            related_counseling,
-            related_organizations,
-            "counseling",
-            "organizations",
-        )
-        # Add matches metadata
-        if search_query:
-            item["matches"] = compute_matches(item, search_query, terms)
         else:
-            item["matches"] = {}
-        housing_return.append(item)
+            links = make_page_links(
+                self_link, page_number, page_size, total_items, name
+            )
+        rows.close()
+        tail = {
+            "jsonapi": {"version": "1.0"},
+            "links": links,
+            "meta": {"total": total_items},
+        }
+        yield "]," + app.json.dumps(tail)[1:]
+
+    return app.response_class(
+        stream_with_context(generate()), mimetype="application/json"
+    )
 
-    page_number = int(request.args.get("page[number]", 1))
-    page_size = int(request.args.get("page[size]", 3))
-    total_items = len(housing_return)
-    total_pages = (total_items + page_size - 1) // page_size
-    # start/end indices
-    start = (page_number - 1) * page_size
-    end = start + page_size
-    paged_items = [as_resource(item, "housing") for item in housing_return[start:end]]
-    links = {
-        "self": "/api/housing",
-        "first": make_page_link(1, page_size, "get_all_housing"),
-        "last": make_page_link(total_pages, page_size, "get_all_housing"),
-        "prev": (
-            make_page_link(page_number - 1, page_size, "get_all_housing")
-            if page_number > 1
-            else None
-        ),
-        "next": (
-            make_page_link(page_number + 1, page_size, "get_all_housing")
-            if page_number < total_pages
-            else None
-        ),
-    }
+
+def render_list(Model, self_link, name):
+    query = db.session.query(Model)
+    # apply query options
+    query = apply_query_options(query, request, Model)
+    fields = get_fieldset(Model)
+    sort_field, _ = get_sort(request, Model)
+    query = query.options(*fieldset_options(Model, fields, [sort_field]))
+    if "cluster" in request.args:
+        clustered = render_clusters(query, Model, self_link)
+        if clustered is not None:
+            return clustered
+
+    _, page_size = get_page_params()
+    # prev links walk the reversed order and need the whole page to flip it
+    backward = is_keyset_request() and keyset_query(query, Model)[3]
+    if page_size >= STREAM_PAGE_SIZE and not backward:
+        total_items = count_results(query, Model)
+        if not total_items:
+            return {"error": "Not found"}, 404
+        return stream_list(query, Model, fields, self_link, name, total_items)
+
+    # only the rows on the requested page are loaded and serialized
+    rows, links, total_items = fetch_page(query, Model, self_link, name)
+    if not total_items:
+        return {"error": "Not found"}, 404
     response = {
-        "data": paged_items,
+        "data": list(resource_items(Model, rows, fields)),
         "jsonapi": {"version": "1.0"},
         "links": links,
-        "meta": {"total": len(housing_return)},
+        "meta": {"total": total_items},
     }
     return jsonify(response)
 
 
+@app.route("/api/housing", methods=["GET"])
+def get_all_housing():
+    return render_list(Housing, "/api/housing", "get_all_housing")
+
+
 @app.route("/api/counseling", methods=["GET"])
 def get_all_counseling():
-    query = db.session.query(Counseling)
-    counseling_return = apply_query_options(query, request, Counseling)
-    all_counseling = counseling_return.all()
-    search_query = request.args.get("search", "").strip()
-    terms = [t.strip() for t in search_query.split() if t.strip()]
-    if not all_counseling:
-        return {"error": "Not found"}, 404
-    counseling_return = []
-    for counseling in all_counseling:
-        state_ids = [s.id for s in counseling.states]
-        if not state_ids:
-            state_ids = [-1]  # no match
-        related_housing = (
-            db.session.query(Housing.id, Housing.name, Housing.category)
-            .join(housing_state)
-            .filter(housing_state.c.state_id.in_(state_ids))
-            .all()
-        )
-        related_organizations = (
-            db.session.query(
-                Organizations.id, Organizations.name, Organizations.category
-            )
-            .join(organization_state)
-            .filter(organization_state.c.state_id.in_(state_ids))
-            .all()
-        )
-        item = serialize_model(
-            counseling,
-            related_housing,
-            related_organizations,
-            "housing",
-            "organizations",
-        )
-        if search_query:
-            item["matches"] = compute_matches(item, search_query, terms)
-        else:
-            item["matches"] = {}
-        counseling_return.append(item)
+    return render_list(Counseling, "/api/counseling", "get_all_counseling")
 
-    page_number = int(request.args.get("page[number]", 1))
-    page_size = int(request.args.get("page[size]", 3))
-    total_items = len(counseling_return)
-    total_pages = (total_items + page_size - 1) // page_size
-    # start/end indices
-    start = (page_number - 1) * page_size
-    end = start + page_size
-    paged_items = [
-        as_resource(item, "counseling") for item in counseling_return[start:end]
+
+@app.route("/api/organizations", methods=["GET"])
+def get_all_organizations():
+    return render_list(Organizations, "/api/organizations", "get_all_organizations")
+
+
+# ---- NEARBY ----
+NEARBY_MODELS = [
+    (Housing, "housing"),
+    (Counseling, "counseling"),
+    (Organizations, "organizations"),
+]
+NEARBY_DEFAULT_LIMIT = 10
+NEARBY_MAX_LIMIT = 100
+
+
+def select_models(model_list):
+    """Narrow [(Model, name)] to the one named by model=, if given."""
+    model_filter = request.args.get("model")
+    if not model_filter:
+        return model_list
+    selected = [(m, name) for m, name in model_list if name == model_filter.lower()]
+    if not selected:
+        raise InvalidQuery(f"No such model: {model_filter}")
+    return selected
+
+
+@app.route("/api/nearby", methods=["GET"])
+def nearby():
+    """The closest resources to lat/lng, nearest first, with distances.
+
+    radius_km caps the distance, model limits the search to one model and
+    limit (at most NEARBY_MAX_LIMIT) sets how many resources come back.
+    """
+    lat = get_float_param("lat", -90, 90)
+    lng = get_float_param("lng", -180, 180)
+    radius_km = get_float_param("radius_km", 0, 20038, default=float("inf"))
+    limit = int(
+        get_float_param("limit", 1, NEARBY_MAX_LIMIT, default=NEARBY_DEFAULT_LIMIT)
+    )
+    model_list = select_models(NEARBY_MODELS)
+
+    ranked = [
+        [
+            (distance, order, Model, id)
+            for distance, id in get_geo_index(Model).nearest(lat, lng, limit, radius_km)
+        ]
+        for order, (Model, _) in enumerate(model_list)
     ]
-    links = {
-        "self": "/api/counseling",
-        "first": make_page_link(1, page_size, "get_all_counseling"),
-        "last": make_page_link(total_pages, page_size, "get_all_counseling"),
-        "prev": (
-            make_page_link(page_number - 1, page_size, "get_all_counseling")
-            if page_number > 1
-            else None
-        ),
-        "next": (
-            make_page_link(page_number + 1, page_size, "get_all_counseling")
-            if page_number < total_pages
-            else None
-        ),
-    }
+    hits = list(itertools.islice(heapq.merge(*ranked), limit))
+    resources = load_resources([(Model, id) for _, _, Model, id in hits])
+    data = []
+    for distance, _, Model, id in hits:
+        resource = resources.get((Model, id))
+        if resource is not None:
+            resource["meta"] = {"distance_km": round(distance, 3)}
+            data.append(resource)
     response = {
-        "data": paged_items,
+        "data": data,
         "jsonapi": {"version": "1.0"},
-        "links": links,
-        "meta": {"total": len(counseling_return)},
+        "meta": {"total": len(data)},
     }
     return jsonify(response)
 
 
-@app.route("/api/organizations", methods=["GET"])
-def get_all_organizations():
-    query = db.session.query(Organizations)
-    # apply query options
-    organizations_return = apply_query_options(query, request, Organizations)
-    # get all query options
-    all_organizations = organizations_return.all()
-    search_query = request.args.get("search", "").strip()
-    terms = [t.strip() for t in search_query.split() if t.strip()]
-    organizations_return = []
-    if not all_organizations:
-        return {"error": "Not found"}, 404
-    # building the table connections while also serializing the data entries to return
-    for organizations in all_organizations:
-        state_ids = [s.id for s in organizations.states]
-        if not state_ids:
-            state_ids = [-1]  # no match
-        related_housing = (
-            db.session.query(Housing.id, Housing.name, Housing.category)
-            .join(housing_state)
-            .filter(housing_state.c.state_id.in_(state_ids))
-            .all()
-        )
-        related_counseling = (
-            db.session.query(Counseling.id, Counseling.name, Counseling.category)
-            .join(counseling_state)
-            .filter(counseling_state.c.state_id.in_(state_ids))
-            .all()
-        )
-        item = serialize_model(
-            organizations,
-            related_housing,
-            related_counseling,
-            "housing",
-            "counseling",
-        )
-        if search_query:
-            item["matches"] = compute_matches(item, search_query, terms)
-        else:
-            item["matches"] = {}
-        organizations_return.append(item)
+# ---- STATS ----
+STATS_MODELS = NEARBY_MODELS
+# Rating histogram bins: [0, 1), [1, 2), ... with 5.0 counted in the last one
+RATING_BINS = 5
 
-    page_number = int(request.args.get("page[number]", 1))
-    page_size = int(request.args.get("page[size]", 3))
-    total_items = len(organizations_return)
-    total_pages = (total_items + page_size - 1) // page_size
-    # start/end indices
-    start = (page_number - 1) * page_size
-    end = start + page_size
-    paged_items = [
-        as_resource(item, "organizations") for item in organizations_return[start:end]
+# Aggregates per model, tagged with the table version they were computed at
+_stats_cache = {}
+
+
+def count_by(Model, column):
+    rows = (
+        db.session.query(column, func.count())
+        .group_by(column)
+        .order_by(func.count().desc(), column)
+        .all()
+    )
+    return [{"value": value, "count": count} for value, count in rows]
+
+
+def count_types(Model):
+    """Count the resources linked to each type."""
+    key = TYPE_LINKS[Model]
+    count = func.count(key)
+    rows = (
+        db.session.query(ResourceType.name, count)
+        .join(key.table, key.table.c.type_id == ResourceType.id)
+        .group_by(ResourceType.name)
+        .order_by(count.desc(), ResourceType.name)
+        .all()
+    )
+    return [{"value": value, "count": count} for value, count in rows]
+
+
+def rating_histogram(Model):
+    bin_of = case(
+        *[(Model.rating >= low, low) for low in range(RATING_BINS - 1, 0, -1)],
+        else_=0,
+    )
+    rows = (
+        db.session.query(bin_of, func.count())
+        .filter(Model.rating.isnot(None))
+        .group_by(bin_of)
+        .all()
+    )
+    counts = dict(rows)
+    return [
+        {"range": f"{low:.1f}-{low + 1:.1f}", "count": counts.get(low, 0)}
+        for low in range(RATING_BINS)
     ]
-    links = {
-        "self": "/api/organizations",
-        "first": make_page_link(1, page_size, "get_all_organizations"),
-        "last": make_page_link(total_pages, page_size, "get_all_organizations"),
-        "prev": (
-            make_page_link(page_number - 1, page_size, "get_all_organizations")
-            if page_number > 1
-            else None
-        ),
-        "next": (
-            make_page_link(page_number + 1, page_size, "get_all_organizations")
-            if page_number < total_pages
-            else None
-        ),
+
+
+def model_stats(Model):
+    version = table_version(Model.__tablename__)
+    cached = _stats_cache.get(Model)
+    if cached and cached[0] == version:
+        return cached[1]
+    stats = {
+        "total": db.session.query(func.count(Model.id)).scalar(),
+        "by_state": count_by(Model, Model.state),
+        "by_category": count_by(Model, Model.category),
+        "by_keyword": count_by(Model, Model.keyword),
+        "by_type": count_types(Model),
+        "rating_histogram": rating_histogram(Model),
+        "unrated": db.session.query(func.count(Model.id))
+        .filter(Model.rating.is_(None))
+        .scalar(),
     }
+    _stats_cache[Model] = (version, stats)
+    return stats
+
+
+@app.route("/api/stats", methods=["GET"])
+def stats():
+    """Per-model counts by state, category, keyword and type, and ratings.
+
+    Computed with GROUP BY in the database and cached until the model's
+    table changes; model= limits the response to one model.
+    """
+    model_list = select_models(STATS_MODELS)
     response = {
-        "data": paged_items,
+        "data": [
+            {"id": name, "type": "stats", "attributes": model_stats(Model)}
+            for Model, name in model_list
+        ],
         "jsonapi": {"version": "1.0"},
-        "links": links,
-        "meta": {"total": len(organizations_return)},
     }
     return jsonify(response)
 
 
-@app.route("/api/search_all", methods=["GET"])
-def search_all():
-    search_query = request.args.get("search")
-    if not search_query:
-        return jsonify({"error": "No search query provided"}), 400
+# ---- EXPORT ----
+EXPORT_MODELS = {
+    "housing": Housing,
+    "counseling": Counseling,
+    "organizations": Organizations,
+}
+# Rows fetched per round trip while exporting
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_lines(Model, query, fields):
+    """Yield one NDJSON line per row, in batches of EXPORT_BATCH_SIZE."""
+    serializer = SERIALIZERS[Model]
+    with_related = include_in_state_resources(fields)
+    for batch in batched(stream_rows(query, EXPORT_BATCH_SIZE), EXPORT_BATCH_SIZE):
+        in_state = load_in_state_resources(Model, batch) if with_related else {}
+        lines = []
+        for row in batch:
+            related = in_state.get(row.id)
+            if related is not None:
+                # related resources are referenced by id only
+                related = {
+                    name: [summary["id"] for summary in summaries]
+                    for name, summaries in related.items()
+                }
+            lines.append(app.json.dumps(serializer.item(row, related, fields)))
+        yield "\n".join(lines) + "\n"
+
+
+@app.route("/api/<model_name>/export", methods=["GET"])
+def export_model(model_name):
+    """Stream every matching row as newline-delimited JSON.
 
-    model_filter = request.args.get("model")  # optional filter by model
-    results = []
-    # Define models and their names
-    model_list = [
-        (Organizations, "organizations"),
-        (Housing, "housing"),
-        (Counseling, "counseling"),
+    Takes the same filter, search, sort and fields parameters as the list
+    endpoints, ignores paging, and is gzip/brotli encoded on request.
+    """
+    Model = EXPORT_MODELS.get(model_name)
+    if Model is None:
+        return {"error": "Not found"}, 404
+    query = apply_query_options(db.session.query(Model), request, Model)
+    fields = get_fieldset(Model)
+    sort_field, _ = get_sort(request, Model)
+    query = query.options(*fieldset_options(Model, fields, [sort_field]))
+    response = app.response_class(
+        stream_with_context(export_lines(Model, query, fields)),
+        mimetype="application/x-ndjson",
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={model_name}.ndjson"
+    )
+    return response
+
+
+def search_terms(Model, search_query):
+    # Split into terms and remove ignored words
+    return [
+        term.strip()
+        for term in search_query.split()
+        if term.strip() and term.lower() not in IGNORE_WORDS.get(Model.__name__, [])
     ]
 
-    # Apply model filter if provided
-    if model_filter:
-        model_list = [
-            (m, name) for m, name in model_list if name.lower() == model_filter.lower()
-        ]
-        if not model_list:
-            return jsonify({"error": f"No such model: {model_filter}"}), 400
 
-    for Model, model_name in model_list:
-        query = db.session.query(Model)
+def merge_ranked(ranked, depth):
+    """Merge per-model hit lists, each already best first, into the top `depth`.
 
-        # --- SEARCH LOGIC ---
-        # Split into terms and remove ignored words
-        terms = [
-            term.strip()
-            for term in search_query.split()
-            if term.strip() and term.lower() not in IGNORE_WORDS.get(Model.__name__, [])
-        ]
-        full_phrase = search_query.strip().lower()
+    Entries are (-matched terms, -score, model order, rank, Model, model_name,
+    id), the key each list is sorted on: hits with more of the terms come
+    first whatever their model, and ties keep the model order and each
+    model's own ranking. Returns (Model, name, id).
+    """
+    merged = itertools.islice(heapq.merge(*ranked), depth)
+    return [hit[4:] for hit in merged]
 
-        # Collect text-like columns
-        text_columns = [
-            column
-            for column in Model.__table__.columns
-            if "char" in str(column.type).lower() or "text" in str(column.type).lower()
-        ]
 
-        # Build search filters (SQL filtering)
-        search_filters = []
-        for column in text_columns:
-            search_filters.append(column.ilike(f"%{full_phrase}%"))  # full phrase match
-            for term in terms:  # individual term match
-                search_filters.append(column.ilike(f"%{term}%"))
+def text_columns_of(Model):
+    # Collect text-like columns
+    return [
+        col
+        for col in Model.__table__.columns
+        if "char" in str(col.type).lower() or "text" in str(col.type).lower()
+    ]
 
-        if search_filters:
-            query = query.filter(or_(*search_filters))
 
-        query_results = query.all()
-
-        # --- SCORING & SERIALIZATION ---
-        for item in query_results:
-            # Calculate relevance score
-            score = 0
-            for column in text_columns:
-                col_text = (getattr(item, column.name) or "").lower()
-                if full_phrase in col_text:
-                    score += 10  # full phrase match
-                score += sum(1 for term in terms if term in col_text)
-
-            # Get related resources via states
-            state_ids = [s.id for s in item.states] if item.states else [-1]
-
-            related_counseling = (
-                db.session.query(Counseling.id, Counseling.name, Counseling.category)
-                .join(counseling_state)
-                .filter(counseling_state.c.state_id.in_(state_ids))
-                .all()
-            )
-            related_organizations = (
-                db.session.query(
-                    Organizations.id, Organizations.name, Organizations.category
-                )
-                .join(organization_state)
-                .filter(organization_state.c.state_id.in_(state_ids))
-                .all()
-            )
+def like_relevance(Model, full_phrase, terms):
+    """Search filter and relevance score for the LIKE backend, both in SQL.
+
+    A phrase hit in a column is worth 10 and each term hit 1, summed over
+    every text column.
+    """
+    search_filters = []
+    weights = []
+    for col in text_columns_of(Model):
+        phrase_hit = col.ilike(f"%{full_phrase}%")  # full phrase match
+        search_filters.append(phrase_hit)
+        weights.append(case((phrase_hit, 10), else_=0))
+        for term in terms:  # individual term match
+            term_hit = col.ilike(f"%{term}%")
+            search_filters.append(term_hit)
+            weights.append(case((term_hit, 1), else_=0))
+    return or_(*search_filters), functools.reduce(operator.add, weights)
+
+
+def search_with_index(model_list, full_phrase, depth):
+    """Rank hits with the in-memory BM25 index.
+
+    Returns the total number of hits and the best `depth` of them as
+    (Model, model_name, id).
+    """
+    total = 0
+    ranked = []
+    for order, (Model, model_name) in enumerate(model_list):
+        terms = search_terms(Model, full_phrase)
+        count, top = get_search_index(Model).search(full_phrase, terms, depth)
+        total += count
+        ranked.append(
+            [
+                (-matched, -score, order, rank, Model, model_name, id)
+                for rank, (matched, score, id) in enumerate(top)
+            ]
+        )
+    return total, merge_ranked(ranked, depth)
+
+
+def union_branch(Model, order, full_phrase, backend, columns):
+    """One model's SELECT for the search_all union.
+
+    Projects the model's position in the model list, its relevance as
+    "score", its id, and the resource columns in `columns` under their
+    attribute names. Columns outside the model's own fieldset are typed
+    NULLs, which keep every branch the same shape without reading them.
+    """
+    fields = get_fieldset(Model)
+    terms = search_terms(Model, full_phrase)
+    if backend == "fulltext":
+        query, relevance = apply_fulltext_search(
+            db.session.query(Model.id), Model, full_phrase, terms
+        )
+    else:
+        condition, relevance = like_relevance(Model, full_phrase, terms)
+        query = db.session.query(Model.id).filter(condition)
+    return query.with_entities(
+        literal(order).label("model_order"),
+        relevance.label("score"),
+        Model.id.label("id"),
+        *[
+            (
+                getattr(Model, field)
+                if fields is None or field in fields
+                else type_coerce(null(), getattr(Model, field).type)
+            ).label(field)
+            for field in columns
+        ],
+    ).statement
+
+
+def search_with_union(model_list, full_phrase, offset, limit, backend):
+    """Rank every model's hits in one UNION ALL round trip.
+
+    Ordering (score, then model order, then id), paging and the total all
+    run in the database. Returns the total and the page as
+    [(Model, model_name, row)], where each row carries the columns of the
+    requested fieldsets.
+    """
+    fieldsets = [get_fieldset(Model) for Model, _ in model_list]
+    columns = [
+        field
+        for field in RESOURCE_FIELDS
+        if field != "id"
+        and any(fields is None or field in fields for fields in fieldsets)
+    ]
+    branches = [
+        union_branch(Model, order, full_phrase, backend, columns)
+        for order, (Model, _) in enumerate(model_list)
+    ]
+    hits = union_all(*branches).subquery("hits")
+    page = (
+        select(hits, func.count().over().label("total"))
+        .order_by(hits.c.score.desc(), hits.c.model_order, hits.c.id)
+        .limit(limit)
+        .offset(offset)
+    )
+    rows = db.session.execute(page).all()
+    if rows:
+        total = rows[0].total
+    elif offset:
+        # past the last page the window has nothing to count over
+        total = db.session.execute(select(func.count()).select_from(hits)).scalar()
+    else:
+        total = 0
+    return total, [(*model_list[row.model_order], row) for row in rows]
 
-            serialized = serialize_model(
-                item,
-                related_counseling,
-                related_organizations,
-                "counseling",
-                "organizations",
-            )
 
-            # --- Add matches metadata ---
-            serialized["matches"] = (
-                compute_matches(serialized, full_phrase, terms) if search_query else {}
-            )
+# search_all backends that rank in SQL
+UNION_SEARCH_BACKENDS = {"fulltext", "like"}
 
-            results.append(
-                {
-                    "data": serialized,
-                    "model_type": model_name,
-                    "_score": score,
-                }
+
+def load_resources(keys):
+    """Serialize the rows behind [(Model, id)], keyed by (Model, id).
+
+    Rows and their related resources are loaded with one batch per model.
+    """
+    ids_by_model = defaultdict(list)
+    for Model, id in keys:
+        ids_by_model[Model].append(id)
+
+    resources = {}
+    for Model, ids in ids_by_model.items():
+        fields = get_fieldset(Model)
+        rows = (
+            db.session.query(Model)
+            .options(*fieldset_options(Model, fields))
+            .filter(Model.id.in_(ids))
+            .all()
+        )
+        # related resources for every hit, batched per model
+        in_state = {}
+        if include_in_state_resources(fields):
+            in_state = load_in_state_resources(Model, rows)
+        serializer = SERIALIZERS[Model]
+        for row in rows:
+            resources[(Model, row.id)] = serializer.resource(
+                row, in_state.get(row.id), fields
+            )
+    return resources
+
+
+def highlight_hits(hits, resources, full_phrase):
+    """Add matches to each hit's resource, returned in hit order."""
+    highlight_fields = get_highlight_fields()
+    highlighters = {}
+    page = []
+    for Model, _, id in hits:
+        resource = resources.get((Model, id))
+        if resource is None:
+            continue
+        if Model not in highlighters:
+            highlighters[Model] = Highlighter(
+                full_phrase, search_terms(Model, full_phrase)
             )
+        # --- Add matches metadata ---
+        attributes = resource["attributes"]
+        attributes["matches"] = highlighters[Model].matches(
+            attributes, highlight_fields
+        )
+        page.append(resource)
+    return page
+
+
+def materialize_hits(hits, full_phrase):
+    """Load, serialize and highlight only the hits on the page, in order."""
+    resources = load_resources([(Model, id) for Model, _, id in hits])
+    return highlight_hits(hits, resources, full_phrase)
+
+
+def serialize_union_hits(hits, full_phrase):
+    """Serialize search_with_union rows, which already hold the fieldsets."""
+    rows_by_model = defaultdict(list)
+    for Model, _, row in hits:
+        rows_by_model[Model].append(row)
+    resources = {}
+    for Model, rows in rows_by_model.items():
+        fields = get_fieldset(Model)
+        in_state = {}
+        if include_in_state_resources(fields):
+            in_state = load_in_state_resources(Model, rows)
+        serializer = SERIALIZERS[Model]
+        for row in rows:
+            resources[(Model, row.id)] = serializer.resource(
+                row, in_state.get(row.id), fields
+            )
+    return highlight_hits(
+        [(Model, name, row.id) for Model, name, row in hits], resources, full_phrase
+    )
 
-    # --- SORT BY RELEVANCE ---
-    results.sort(key=lambda x: x["_score"], reverse=True)
 
-    # --- PAGINATION ---
-    page_number = int(request.args.get("page[number]", 1))
-    page_size = int(request.args.get("page[size]", 3))
-    total_items = len(results)
-    total_pages = (total_items + page_size - 1) // page_size
-    start = (page_number - 1) * page_size
-    end = start + page_size
-    paged_items = [
-        as_resource(item["data"], item["model_type"]) for item in results[start:end]
-    ]
+@app.route("/api/search_all", methods=["GET"])
+def search_all():
+    search_query = request.args.get("search")
+    if not search_query:
+        return jsonify({"error": "No search query provided"}), 400
 
-    links = {
-        "self": "/api/search_all",
-        "first": make_page_link(1, page_size, "search_all"),
-        "last": make_page_link(total_pages, page_size, "search_all"),
-        "prev": (
-            make_page_link(page_number - 1, page_size, "search_all")
-            if page_number > 1
-            else None
-        ),
-        "next": (
-            make_page_link(page_number + 1, page_size, "search_all")
-            if page_number < total_pages
-            else None
-        ),
-    }
+    # Define models and their names, narrowed by the optional model filter
+    model_list = select_models(
+        [
+            (Organizations, "organizations"),
+            (Housing, "housing"),
+            (Counseling, "counseling"),
+        ]
+    )
+
+    full_phrase = search_query.strip().lower()
+    page_number, page_size = get_page_params()
+    offset = (page_number - 1) * page_size
+    backend = app.config["SEARCH_BACKEND"]
+    if backend == "index":
+        # ranking only has to go as deep as the requested page
+        total_items, hits = search_with_index(
+            model_list, full_phrase, page_number * page_size
+        )
+        paged_items = materialize_hits(hits[offset:], full_phrase)
+    else:
+        if backend not in UNION_SEARCH_BACKENDS:
+            backend = "like"
+        total_items, hits = search_with_union(
+            model_list, full_phrase, offset, page_size, backend
+        )
+        paged_items = serialize_union_hits(hits, full_phrase)
     response = {
         "data": paged_items,
         "jsonapi": {"version": "1.0"},
-        "links": links,
+        "links": make_page_links(
+            "/api/search_all", page_number, page_size, total_items, "search_all"
+        ),
         "meta": {"total": total_items},
     }
     return jsonify(response)
@@ -0,0 +1,121 @@
+# bench_highlight.py
+"""Compare the single-pass Highlighter with the old per-term compute_matches.
+
+Run with: python bench_highlight.py
+"""
+import re
+import timeit
+
+from highlight import Highlighter
+
+
+def legacy_compute_matches(data_dict, search_query, terms):
+    # compute_matches as it was before highlight.py, kept for comparison
+    matches = {}
+    if not (search_query or terms):
+        return matches
+    phrase = re.escape(search_query) if search_query else None
+
+    def scan_field(path, text):
+        found = []
+        text = str(text)
+        if phrase:
+            for m in re.finditer(phrase, text, flags=re.IGNORECASE):
+                found.append({"term": search_query, "indices": [(m.start(), m.end())]})
+        for term in terms:
+            if search_query and term.lower() == search_query.lower():
+                continue
+            t = re.escape(term)
+            indices = [
+                (m.start(), m.end()) for m in re.finditer(t, text, flags=re.IGNORECASE)
+            ]
+            if indices:
+                found.append({"term": term, "indices": indices})
+        if found:
+            unique_found = []
+            seen = set()
+            for item in found:
+                key = (item["term"].lower(), tuple(item["indices"]))
+                if key not in seen:
+                    seen.add(key)
+                    unique_found.append(item)
+            matches[path] = unique_found
+
+    def walk(path, value):
+        if isinstance(value, str):
+            scan_field(path, value)
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                walk(f"{path}[{i}]", item)
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                walk(f"{path}.{k}", v)
+
+    walk("", data_dict)
+    return matches
+
+
+def make_item(related_per_model):
+    """A housing row as serialize_model returns it, in a populous state."""
+    return {
+        "id": 1,
+        "place_id": "ChIJN1t_tDeuEmsRUsoyG83frY4",
+        "name": "Transitional Housing for Foster Youth",
+        "address": "1200 Congress Ave, Austin, TX 78701, United States",
+        "lat": 30.27,
+        "lng": -97.74,
+        "rating": 4.5,
+        "types": ["point_of_interest", "establishment", "real_estate_agency"],
+        "category": "housing",
+        "keyword": "transitional housing",
+        "phone": "(512) 555-0100",
+        "website": "https://example.org/youth-housing",
+        "photo_url": "https://maps.googleapis.com/maps/api/place/photo?maxwidth=800",
+        "state": "Texas",
+        "source": "Google Places",
+        "retrieved_at": "2025-10-01T12:00:00",
+        "in_state_resources": {
+            "counseling": [
+                {"id": i, "name": f"Youth Trauma Therapy {i}", "category": "counseling"}
+                for i in range(related_per_model)
+            ],
+            "organizations": [
+                {"id": i, "name": f"Foster Youth Support {i}", "category": "organization"}
+                for i in range(related_per_model)
+            ],
+        },
+    }
+
+
+def main():
+    search_query = "foster youth housing"
+    terms = search_query.split()
+    page = [make_item(200) for _ in range(25)]
+
+    def legacy():
+        for item in page:
+            legacy_compute_matches(item, search_query, terms)
+
+    def single_pass():
+        highlighter = Highlighter(search_query, terms)
+        for item in page:
+            highlighter.matches(item)
+
+    def single_pass_restricted():
+        highlighter = Highlighter(search_query, terms)
+        for item in page:
+            highlighter.matches(item, {"name", "address", "keyword"})
+
+    runs = 5
+    baseline = min(timeit.repeat(legacy, number=1, repeat=runs))
+    print(f"{'compute_matches':<28}{baseline * 1000:9.1f} ms/page")
+    for label, fn in [
+        ("Highlighter", single_pass),
+        ("Highlighter (3 fields)", single_pass_restricted),
+    ]:
+        best = min(timeit.repeat(fn, number=1, repeat=runs))
+        print(f"{label:<28}{best * 1000:9.1f} ms/page  {baseline / best:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
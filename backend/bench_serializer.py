@@ -0,0 +1,115 @@
+# bench_serializer.py
+"""Compare ResourceSerializer + FastJSONProvider with the old serialize path.
+
+Run with: python bench_serializer.py
+
+Only transient rows are serialized, so the app is imported with its test
+configuration (an in-memory SQLite database) and needs no MYSQL_* settings.
+"""
+import datetime
+import os
+import timeit
+
+from flask import Flask
+
+import serializer
+
+os.environ.setdefault("RUNNING_TESTS", "1")
+from app import Housing, RESOURCE_FIELDS
+from serializer import FastJSONProvider, ResourceSerializer
+
+
+def legacy_serialize_model(model, in_state_resources, fields=None):
+    # serialize_model as it was before serializer.py, kept for comparison
+    item = {}
+    for field in RESOURCE_FIELDS:
+        if fields is not None and field != "id" and field not in fields:
+            continue
+        value = getattr(model, field)
+        if field == "retrieved_at" and value is not None:
+            value = value.isoformat()
+        item[field] = value
+    if in_state_resources is not None:
+        item["in_state_resources"] = in_state_resources
+    return item
+
+
+def legacy_as_resource(item, resource_type):
+    return {
+        "id": str(item["id"]),
+        "type": resource_type,
+        "attributes": {k: v for k, v in item.items() if k != "id"},
+    }
+
+
+def make_row(id, related_per_model):
+    """A transient Housing row and its related lists, as a list page has them."""
+    row = Housing(
+        id=id,
+        place_id="ChIJN1t_tDeuEmsRUsoyG83frY4",
+        name="Transitional Housing for Foster Youth",
+        address="1200 Congress Ave, Austin, TX 78701, United States",
+        lat=30.27,
+        lng=-97.74,
+        rating=4.5,
+        types=["point_of_interest", "establishment", "real_estate_agency"],
+        category="housing",
+        keyword="transitional housing",
+        phone="(512) 555-0100",
+        website="https://example.org/youth-housing",
+        photo_url="https://maps.googleapis.com/maps/api/place/photo?maxwidth=800",
+        state="Texas",
+        source="Google Places",
+        retrieved_at=datetime.datetime(2025, 10, 1, 12, 0, 0),
+    )
+    in_state = {
+        "counseling": [
+            {"id": i, "name": f"Youth Trauma Therapy {i}"}
+            for i in range(related_per_model)
+        ],
+        "organizations": [
+            {"id": i, "name": f"Foster Youth Support {i}"}
+            for i in range(related_per_model)
+        ],
+    }
+    return row, in_state
+
+
+def main():
+    page = [make_row(i, 20) for i in range(100)]
+    stdlib_app = Flask("legacy")
+    fast_app = Flask("fast")
+    fast_app.json = FastJSONProvider(fast_app)
+    resources = ResourceSerializer(Housing, RESOURCE_FIELDS)
+
+    def document(data):
+        return {"data": data, "jsonapi": {"version": "1.0"}, "meta": {"total": 100}}
+
+    def legacy():
+        data = [
+            legacy_as_resource(legacy_serialize_model(row, in_state), "housing")
+            for row, in_state in page
+        ]
+        stdlib_app.json.dumps(document(data))
+
+    def fast():
+        data = [resources.resource(row, in_state) for row, in_state in page]
+        fast_app.json.dumps(document(data))
+
+    def fast_build_only():
+        [resources.resource(row, in_state) for row, in_state in page]
+
+    runs = 20
+    baseline = min(timeit.repeat(legacy, number=1, repeat=runs))
+    print(f"encoder: {'orjson' if serializer.orjson else 'json (stdlib)'}")
+    print(f"{'serialize_model + jsonify':<28}{baseline * 1000:9.2f} ms/page")
+    for label, fn in [
+        ("ResourceSerializer + dumps", fast),
+        ("ResourceSerializer only", fast_build_only),
+    ]:
+        best = min(timeit.repeat(fn, number=1, repeat=runs))
+        print(f"{label:<28}{best * 1000:9.2f} ms/page  {baseline / best:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,39 @@
 import requests
 import mysql.connector
+import argparse
+import os
+import sqlite3
 import time
-import json
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+from place_writer import Checkpoint, PlaceWriter, stored_places
+from places_cache import PlacesCache
 
 API_KEY = ""
+# Set to a places_stub.py address to run the pipeline offline
+PLACES_API_URL = os.environ.get(
+    "PLACES_API_URL", "https://maps.googleapis.com/maps/api/place"
+)
+
+# Places quota shared by every worker: requests per second, and how many may
+# go out back to back after an idle spell
+REQUESTS_PER_SECOND = 10
+REQUEST_BURST = 10
+SEARCH_WORKERS = 8  # (state, category) tasks searching at once
+DETAIL_WORKERS = 16  # place detail lookups in flight
+PAGE_TOKEN_DELAY = 2  # seconds before a next_page_token can be used
+RETRY_DELAYS = [2, 4, 8, 16, 32]  # backoff for OVER_QUERY_LIMIT and friends
+
+# Responses are reused from the on-disk cache while younger than these
+CACHE_PATH = os.path.join(os.path.dirname(__file__), "places_cache.sqlite")
+SEARCH_TTL = 7 * 24 * 3600  # seconds
+DETAILS_TTL = 7 * 24 * 3600
+# Stored rows older than this are refreshed; keep it above the cache TTLs so
+# a refresh does not just replay the response the row was built from
+STALE_AFTER = timedelta(days=30)
 
 CATEGORIES = {
     "counseling": [
@@ -80,157 +109,389 @@ STATES = [
     "Wyoming",
 ]
 
-conn = mysql.connector.connect(
-    #credentials removed for public access purposes
-)
-cursor = conn.cursor()
+# Table each category is stored in
+TABLES = {
+    "counseling": "counseling",
+    "organization": "organizations",
+    "housing": "housing",
+}
 
 
-def fetch_places(query, state):
-    """Fetch all pages of Places Text Search results for a query in a state."""
-    results = []
-    url = f"https://maps.googleapis.com/maps/api/place/textsearch/json?query={query.replace(' ', '+')}+in+{state.replace(' ', '+')}&key={API_KEY}"
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens a second, at most capacity saved."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
 
-    while url:
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+limiter = TokenBucket(REQUESTS_PER_SECOND, REQUEST_BURST)
+# one keep-alive session per worker thread
+_sessions = threading.local()
+
+
+def redact(message):
+    """message with the API key masked, for logging."""
+    return message.replace(API_KEY, "<key>") if API_KEY else message
+
+
+def api_get(endpoint, params):
+    """GET a Places endpoint under the shared rate limit.
+
+    Quota and transient errors are retried with backoff in the calling task
+    only. Returns the decoded response, or None once it gives up.
+    """
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+    url = f"{PLACES_API_URL}/{endpoint}/json"
+    for delay in RETRY_DELAYS + [None]:
+        limiter.acquire()
         try:
-            res = requests.get(url)
-            data = res.json()
-        except Exception as e:
-            print(f"Request failed for '{query}' in {state}: {e}")
+            response = session.get(url, params={**params, "key": API_KEY}, timeout=30)
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            # connection errors quote the URL, key and all
+            problem = f"request failed: {redact(str(e))}"
+        else:
+            status = data.get("status")
+            if status in ("OK", "ZERO_RESULTS"):
+                return data
+            problem = f"API returned {status}"
+            # a page token used before it is active reads as INVALID_REQUEST
+            retryable = status in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR") or (
+                status == "INVALID_REQUEST" and "pagetoken" in params
+            )
+            if not retryable:
+                break
+        if delay is None:
             break
+        time.sleep(delay)
+    print(f"Giving up on {endpoint} {params}: {problem}")
+    return None
 
-        status = data.get("status")
-        if status != "OK" and status != "ZERO_RESULTS":
-            print(f"API returned {status} for '{query}' in {state}")
-            break
-        elif status == "OVER_QUERY_LIMIT":
-            print("Hit query limit, sleeping...")
-            time.sleep(60)
-            continue
-        elif status == "UNKNOWN_ERROR":
-            print("Temporary error, retrying...")
-            time.sleep(2)
-            continue
-        elif status not in ("OK", "ZERO_RESULTS"):
-            print(f"API error {status}")
-            break
 
-        results.extend(data.get("results", []))
+# Set by main(); None fetches everything from the API
+cache = None
+
 
-        # Pagination
-        time.sleep(2)
+def fetch_places(query, state, limit):
+    """Fetch up to limit Places Text Search results for a query in a state.
+
+    Further pages are only requested while more results are needed, and the
+    next_page_token delay only holds up this search. Results are cached per
+    search with whether more pages exist. Returns the results and whether
+    the search ran to the end rather than giving up on an error.
+    """
+    key = f"textsearch:{query} in {state}"
+    cached = cache.get(key, SEARCH_TTL) if cache else None
+    if cached is not None and (len(cached["results"]) >= limit or cached["last_page"]):
+        return cached["results"][:limit], True
+    if cache and cache.offline:
+        return (cached or {"results": []})["results"][:limit], False
+
+    results = []
+    params = {"query": f"{query} in {state}"}
+    while True:
+        data = api_get("textsearch", params)
+        if data is None:
+            return results[:limit], False
+        results.extend(data.get("results", []))
         next_page_token = data.get("next_page_token")
-        if next_page_token:
-            time.sleep(2)  # token activation delay
-            url = f"https://maps.googleapis.com/maps/api/place/textsearch/json?pagetoken={next_page_token}&key={API_KEY}"
-        else:
-            url = None
+        if len(results) >= limit or not next_page_token:
+            break
+        time.sleep(PAGE_TOKEN_DELAY)  # token activation delay
+        params = {"pagetoken": next_page_token}
+    if cache:
+        cache.put(key, {"results": results, "last_page": not next_page_token})
+    return results[:limit], True
 
-    return results
 
+DETAIL_FIELDS = "formatted_phone_number,website,photos"
+# a stale row is refreshed from Place Details alone, so it asks for the
+# Text Search fields as well
+REFRESH_FIELDS = "name,formatted_address,geometry,rating,types," + DETAIL_FIELDS
+
+
+def fetch_details_result(place_id, fields):
+    """The Place Details result for place_id, or None if it is unavailable."""
+    key = f"details:{place_id}:{fields}"
+    cached = cache.get(key, DETAILS_TTL) if cache else None
+    if cached is not None or (cache and cache.offline):
+        return cached
+    data = api_get("details", {"place_id": place_id, "fields": fields})
+    if data is None:
+        return None
+    result = data.get("result", {})
+    if cache:
+        cache.put(key, result)
+    return result
 
-def fetch_place_details(place_id):
-    """Fetch phone, website, and photo info for a place."""
-    detail_url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&fields=formatted_phone_number,website,photos&key={API_KEY}"
-    try:
-        detail_res = requests.get(detail_url).json().get("result", {})
-    except Exception as e:
-        print(f"Failed to fetch details for place_id {place_id}: {e}")
-        return None, None, None
 
+def detail_values(detail_res):
+    """(phone, website, photo_url) from a Place Details result."""
     phone = detail_res.get("formatted_phone_number")
     website = detail_res.get("website")
     photo_url = None
     photos = detail_res.get("photos", [])
     if photos:
         photo_ref = photos[0]["photo_reference"]
-        photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=800&photo_reference={photo_ref}&key={API_KEY}"
+        photo_url = (
+            f"{PLACES_API_URL}/photo?maxwidth=800"
+            f"&photo_reference={photo_ref}&key={API_KEY}"
+        )
 
     return phone, website, photo_url
 
 
+def fetch_place_details(place_id):
+    """Fetch phone, website, and photo info for a place."""
+    return detail_values(fetch_details_result(place_id, DETAIL_FIELDS) or {})
+
+
+def refresh_place(place_id):
+    """(place, detail values) for a stored place, or None if unavailable."""
+    result = fetch_details_result(place_id, REFRESH_FIELDS)
+    if not result or "geometry" not in result:
+        return None
+    return {"place_id": place_id, **result}, detail_values(result)
+
+
 MAX_PER_STATE = 5  # maximum number of places per state per category
+# Searches already stored by an interrupted run are skipped by the next one
+CHECKPOINT_PATH = os.path.join(os.path.dirname(__file__), "scrape_checkpoint.json")
 
-# Keep track of how many places we’ve inserted per state/category
-state_category_count = {
-    state: {"counseling": 0, "organization": 0, "housing": 0} for state in STATES
-}
 
-# Main scraping loop with limit
-try:
-    for state in STATES:
-        for category, keywords in CATEGORIES.items():
-            if category == "counseling":
-                table_name = "counseling"
-            elif category == "organization":
-                table_name = "organizations"
-            else:
-                table_name = "housing"
-
-            # Skip this category if we already reached MAX_PER_STATE for the state
-            if state_category_count[state][category] >= MAX_PER_STATE:
+def plan_refresh(conn, stale_after=STALE_AFTER):
+    """Work out what a routine run still has to fetch from the stored rows.
+
+    Returns (known, stale). known maps (state, category) to the place ids
+    already stored for it, so searches only fill the slots these leave.
+    stale lists (state, category, keyword, place_id) for the rows retrieved
+    more than stale_after ago, which are refreshed from Place Details.
+    """
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - stale_after
+    known = {}
+    stale = []
+    for category, table_name in TABLES.items():
+        for state, keyword, place_id, retrieved_at in stored_places(conn, table_name):
+            known.setdefault((state, category), set()).add(place_id)
+            if retrieved_at is None or retrieved_at < cutoff:
+                stale.append((state, category, keyword, place_id))
+    return known, stale
+
+
+def scrape_category(state, category, detail_pool, checkpoint=None, known=()):
+    """Search a state's keywords for one category until MAX_PER_STATE places.
+
+    Keywords run one after another inside the task, as each only fills the
+    slots the previous ones left. Places in known (already stored) take up
+    slots too, and keywords in the checkpoint are not searched again. Every
+    place's detail lookup goes to detail_pool as soon as its search returns.
+
+    Returns [(keyword, [(place, future of (phone, website, photo_url))],
+    whether the search completed)].
+    """
+    # Shuffle keywords to randomize order, the same way on every run so that
+    # reruns can replay their searches from the cache
+    shuffled_keywords = CATEGORIES[category].copy()
+    random.Random(f"{state}|{category}").shuffle(shuffled_keywords)
+
+    seen = set(known)
+    pending = []
+    for keyword in shuffled_keywords:
+        stored = checkpoint.get(state, category, keyword) if checkpoint else None
+        if stored is None:
+            pending.append(keyword)
+        else:
+            seen.update(stored)
+
+    searches = []
+    for keyword in pending:
+        remaining_slots = MAX_PER_STATE - len(seen)
+        if remaining_slots <= 0:
+            break  # we reached the limit for this state/category
+
+        print(f"Searching '{keyword}' ({category}) in {state}...")
+        places, complete = fetch_places(keyword, state, remaining_slots)
+        found = []
+        for place in places:
+            if place["place_id"] in seen:
                 continue
+            seen.add(place["place_id"])
+            details = detail_pool.submit(fetch_place_details, place["place_id"])
+            found.append((place, details))
+        searches.append((keyword, found, complete))
+    return searches
+
+
+def scrape(store=None, checkpoint=None, known=None, stale=()):
+    """Run the (state, category) searches and stale-row refreshes concurrently.
+
+    Without known, every (state, category) is searched; with it, only those
+    short of MAX_PER_STATE stored places. Each finished search is handed to
+    store(state, category, keyword, places, complete) on the calling thread,
+    places being [(place, (phone, website, photo_url))], so database writes
+    stay on one connection. Refreshed rows arrive the same way, one place at
+    a time with complete=False, as they are not searches to checkpoint.
+    Returns the number of places found or refreshed.
+    """
+    total = 0
+    # the detail pool outlives the search pool, which feeds it
+    with ThreadPoolExecutor(DETAIL_WORKERS) as detail_pool, ThreadPoolExecutor(
+        SEARCH_WORKERS
+    ) as search_pool:
+        tasks = {
+            search_pool.submit(
+                scrape_category,
+                state,
+                category,
+                detail_pool,
+                checkpoint,
+                known.get((state, category), ()) if known else (),
+            ): (state, category)
+            for state in STATES
+            for category in CATEGORIES
+            if known is None or len(known.get((state, category), ())) < MAX_PER_STATE
+        }
+        refreshes = {
+            detail_pool.submit(refresh_place, row[3]): row for row in stale
+        }
+        try:
+            for task in as_completed(tasks):
+                state, category = tasks[task]
+                try:
+                    searches = task.result()
+                except Exception as e:
+                    print(f"Scraping {category} in {state} failed: {e}")
+                    continue
+                for keyword, found, complete in searches:
+                    places = []
+                    for place, details in found:
+                        try:
+                            values = details.result()
+                        except Exception as e:
+                            # kept without details; the search is retried
+                            print(f"Details for {place['place_id']} failed: {e}")
+                            values, complete = (None, None, None), False
+                        places.append((place, values))
+                    total += len(places)
+                    if store is not None:
+                        store(state, category, keyword, places, complete)
+            for refresh in as_completed(refreshes):
+                state, category, keyword, place_id = refreshes[refresh]
+                try:
+                    refreshed = refresh.result()
+                except Exception as e:
+                    print(f"Refreshing {place_id} failed: {e}")
+                    continue
+                if refreshed is None:
+                    continue  # left stale, the next run tries again
+                total += 1
+                if store is not None:
+                    store(state, category, keyword, [refreshed], False)
+        except BaseException:
+            # a failed write or Ctrl-C: stop, the checkpoint says where
+            search_pool.shutdown(cancel_futures=True)
+            detail_pool.shutdown(cancel_futures=True)
+            raise
+    return total
+
+
+def main():
+    global cache
+    parser = argparse.ArgumentParser(
+        description="Scrape Google Places into the database."
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only call the API, e.g. places_stub.py"
+    )
+    parser.add_argument(
+        "--sqlite", help="write to this SQLite database instead of MySQL"
+    )
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore an interrupted run's checkpoint"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="search every state and category, not only missing and stale rows",
+    )
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--offline", action="store_true", help="replay the cache, never call the API"
+    )
+    args = parser.parse_args()
+
+    if not args.no_cache:
+        cache = PlacesCache(args.cache, offline=args.offline)
+    started = time.monotonic()
+    if args.dry_run:
+        total = scrape()
+        print(f"Found {total} places in {time.monotonic() - started:.1f}s.")
+        return
+
+    if args.sqlite:
+        conn, dialect = sqlite3.connect(args.sqlite), "sqlite"
+    else:
+        conn = mysql.connector.connect(
+            #credentials removed for public access purposes
+        )
+        dialect = "mysql"
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.clear()
+    elif checkpoint.tasks:
+        print(f"Resuming: {len(checkpoint.tasks)} searches already stored.")
+
+    known, stale = None, []
+    if not args.full:
+        known, stale = plan_refresh(conn)
+        short = sum(
+            len(known.get((state, category), ())) < MAX_PER_STATE
+            for state in STATES
+            for category in CATEGORIES
+        )
+        print(f"Refresh plan: {short} searches to fill, {len(stale)} stale rows.")
+
+    try:
+        with PlaceWriter(conn, dialect, checkpoint=checkpoint) as writer:
+
+            def store(state, category, keyword, places, complete):
+                writer.write(
+                    TABLES[category], state, category, keyword, places, complete
+                )
+
+            total = scrape(store, checkpoint, known, stale)
+    finally:
+        conn.close()
+    # a finished run leaves nothing to resume, the next one refreshes it all
+    checkpoint.clear()
+    print(f"Stored {total} places in {time.monotonic() - started:.1f}s.")
+    if cache:
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses.")
+    print("Data insertion complete.")
+
 
-            # Shuffle keywords to randomize order
-            shuffled_keywords = keywords.copy()
-            random.shuffle(shuffled_keywords)
-
-            for keyword in shuffled_keywords:
-                remaining_slots = MAX_PER_STATE - state_category_count[state][category]
-                if remaining_slots <= 0:
-                    break  # we reached the limit for this state/category
-
-                print(f"Searching '{keyword}' ({category}) in {state}...")
-                places = fetch_places(keyword, state)
-
-                # Limit to remaining slots for the state/category
-                places = places[:remaining_slots]
-
-                for place in places:
-                    place_id = place["place_id"]
-                    name = place.get("name")
-                    address = place.get("formatted_address")
-                    lat = place["geometry"]["location"]["lat"]
-                    lng = place["geometry"]["location"]["lng"]
-                    rating = place.get("rating", 0)
-                    types = json.dumps(place.get("types", []))
-
-                    phone, website, photo_url = fetch_place_details(place_id)
-
-                    try:
-                        cursor.execute(
-                            f"""
-                            INSERT IGNORE INTO {table_name}
-                            (place_id, name, address, lat, lng, rating, types, category, keyword, phone, website, photo_url, state, source)
-                            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                        """,
-                            (
-                                place_id,
-                                name,
-                                address,
-                                lat,
-                                lng,
-                                rating,
-                                types,
-                                category,
-                                keyword,
-                                phone,
-                                website,
-                                photo_url,
-                                state,
-                                "Google Places",
-                            ),
-                        )
-                        state_category_count[state][category] += 1  # update count
-                    except Exception as e:
-                        print(f"DB insert failed for place_id {place_id}: {e}")
-
-                conn.commit()
-                time.sleep(1)  # avoid rate limiting
-finally:
-    cursor.close()
-    conn.close()
-
-cursor.close()
-conn.close()
-print("Data insertion complete.")
+if __name__ == "__main__":
+    main()
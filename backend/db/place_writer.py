@@ -0,0 +1,296 @@
+# place_writer.py
+"""Batched upserts of scraped places, with a checkpoint of finished searches.
+
+Works on a mysql.connector connection or, for offline runs, a sqlite3 one.
+"""
+import json
+import os
+from datetime import datetime, timezone
+
+BATCH_SIZE = 200  # places buffered before a flush
+# Values per IN (...) list when syncing links, under SQLite's 999 variable limit
+LINK_CHUNK = 400
+
+# Columns written for each place, in statement order
+PLACE_COLUMNS = [
+    "place_id",
+    "name",
+    "address",
+    "lat",
+    "lng",
+    "rating",
+    "types",
+    "category",
+    "keyword",
+    "phone",
+    "website",
+    "photo_url",
+    "state",
+    "source",
+    "retrieved_at",
+]
+# Refreshed on a known place_id. category, keyword and state stay as first
+# scraped, and a failed detail lookup (None) keeps the stored detail values.
+REFRESHED_COLUMNS = ["name", "address", "lat", "lng", "rating", "types", "retrieved_at"]
+DETAIL_COLUMNS = ["phone", "website", "photo_url"]
+
+# Link table and key column holding each table's resource types
+TYPE_LINK_TABLES = {
+    "housing": ("housing_type", "housing_id"),
+    "counseling": ("counseling_type", "counseling_id"),
+    "organizations": ("organization_type", "organization_id"),
+}
+
+
+def stored_places(conn, table_name):
+    """[(state, keyword, place_id, retrieved_at)] for every scraped row."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT state, keyword, place_id, retrieved_at FROM {table_name} "
+            "WHERE place_id IS NOT NULL"
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    # sqlite3 hands DATETIME columns back as text
+    return [
+        (
+            state,
+            keyword,
+            place_id,
+            datetime.fromisoformat(retrieved_at)
+            if isinstance(retrieved_at, str)
+            else retrieved_at,
+        )
+        for state, keyword, place_id, retrieved_at in rows
+    ]
+
+
+class Checkpoint:
+    """Searches whose places are committed, kept in a JSON file.
+
+    Each (state, category, keyword) maps to the place ids it stored, so a
+    rerun can skip it and still know how many slots it filled.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tasks = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.tasks = json.load(f)
+
+    @staticmethod
+    def key(state, category, keyword):
+        return f"{state}|{category}|{keyword}"
+
+    def get(self, state, category, keyword):
+        """Place ids stored by a finished search, or None if it has not run."""
+        return self.tasks.get(self.key(state, category, keyword))
+
+    def record(self, finished):
+        """Add {(state, category, keyword): place ids} and save atomically."""
+        for task, place_ids in finished.items():
+            self.tasks[self.key(*task)] = place_ids
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.tasks, f)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        self.tasks = {}
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PlaceWriter:
+    """Buffers places per table and upserts them with one executemany each.
+
+    A flush writes the rows, their type links and the data_version bumps in
+    one transaction, then records the searches they came from in the
+    checkpoint. dialect is "mysql" or "sqlite".
+    """
+
+    def __init__(self, conn, dialect="mysql", batch_size=BATCH_SIZE, checkpoint=None):
+        self.conn = conn
+        self.dialect = dialect
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.mark = "%s" if dialect == "mysql" else "?"
+        self.rows = {}  # table name -> [row tuple]
+        self.types = {}  # table name -> {place_id: {type name}}
+        self.finished = {}  # (state, category, keyword) -> [place id]
+        self.buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # only a clean exit commits what is still buffered
+        if exc_type is None:
+            self.flush()
+
+    def write(self, table_name, state, category, keyword, places, complete=True):
+        """Buffer one search's [(place, (phone, website, photo_url))].
+
+        An incomplete search (one that gave up on an error) has its places
+        written but stays out of the checkpoint, so a rerun tries it again.
+        """
+        retrieved_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = self.rows.setdefault(table_name, [])
+        types = self.types.setdefault(table_name, {})
+        for place, (phone, website, photo_url) in places:
+            place_types = place.get("types", [])
+            rows.append(
+                (
+                    place["place_id"],
+                    place.get("name"),
+                    place.get("formatted_address"),
+                    place["geometry"]["location"]["lat"],
+                    place["geometry"]["location"]["lng"],
+                    place.get("rating", 0),
+                    json.dumps(place_types),
+                    category,
+                    keyword,
+                    phone,
+                    website,
+                    photo_url,
+                    state,
+                    "Google Places",
+                    retrieved_at,
+                )
+            )
+            types[place["place_id"]] = set(place_types)
+        if complete:
+            self.finished[(state, category, keyword)] = [
+                place["place_id"] for place, _ in places
+            ]
+        self.buffered += len(places)
+        if self.buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffered and not self.finished:
+            return
+        cursor = self.conn.cursor()
+        try:
+            for table_name, rows in self.rows.items():
+                if rows:
+                    cursor.executemany(self.upsert_sql(table_name), rows)
+                    self.link_types(cursor, table_name, self.types[table_name])
+                    self.mark_table_changed(cursor, table_name)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        # the searches only count as done once their rows are committed
+        if self.checkpoint is not None:
+            self.checkpoint.record(self.finished)
+        self.rows, self.types, self.finished = {}, {}, {}
+        self.buffered = 0
+
+    def upsert_sql(self, table_name):
+        columns = ", ".join(PLACE_COLUMNS)
+        values = ", ".join([self.mark] * len(PLACE_COLUMNS))
+        if self.dialect == "mysql":
+            updates = [f"{c} = VALUES({c})" for c in REFRESHED_COLUMNS] + [
+                f"{c} = COALESCE(VALUES({c}), {c})" for c in DETAIL_COLUMNS
+            ]
+            conflict = "ON DUPLICATE KEY UPDATE"
+        else:
+            updates = [f"{c} = excluded.{c}" for c in REFRESHED_COLUMNS] + [
+                f"{c} = COALESCE(excluded.{c}, {c})" for c in DETAIL_COLUMNS
+            ]
+            conflict = "ON CONFLICT (place_id) DO UPDATE SET"
+        return (
+            f"INSERT INTO {table_name} ({columns}) VALUES ({values}) "
+            f"{conflict} {', '.join(updates)}"
+        )
+
+    def insert_ignore(self):
+        return "INSERT IGNORE" if self.dialect == "mysql" else "INSERT OR IGNORE"
+
+    def select_in(self, cursor, sql, values):
+        """Rows of sql + " IN (...)" over values, one statement per chunk."""
+        rows = []
+        for start in range(0, len(values), LINK_CHUNK):
+            chunk = values[start : start + LINK_CHUNK]
+            cursor.execute(f"{sql} IN ({', '.join([self.mark] * len(chunk))})", chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    def link_types(self, cursor, table_name, wanted):
+        """Make the type links of the places in {place_id: {type name}} match.
+
+        Rows and types are looked up by their indexed place_id and name, then
+        only the difference is written, as app.sync_type_links does: links a
+        refresh dropped are deleted and new ones inserted.
+        """
+        if not wanted:
+            return
+        link_table, key = TYPE_LINK_TABLES[table_name]
+        names = sorted({name for types in wanted.values() for name in types})
+        cursor.executemany(
+            f"{self.insert_ignore()} INTO resource_type (name) VALUES ({self.mark})",
+            [(name,) for name in names],
+        )
+        type_ids = dict(
+            self.select_in(
+                cursor, "SELECT name, id FROM resource_type WHERE name", names
+            )
+        )
+        row_ids = dict(
+            self.select_in(
+                cursor,
+                f"SELECT place_id, id FROM {table_name} WHERE place_id",
+                sorted(wanted),
+            )
+        )
+        links = {
+            (row_ids[place_id], type_ids[name])
+            for place_id, types in wanted.items()
+            for name in types
+        }
+        existing = set(
+            self.select_in(
+                cursor,
+                f"SELECT {key}, type_id FROM {link_table} WHERE {key}",
+                sorted(row_ids.values()),
+            )
+        )
+        stale = sorted(existing - links)
+        if stale:
+            cursor.executemany(
+                f"DELETE FROM {link_table} "
+                f"WHERE {key} = {self.mark} AND type_id = {self.mark}",
+                stale,
+            )
+        added = sorted(links - existing)
+        if added:
+            cursor.executemany(
+                f"{self.insert_ignore()} INTO {link_table} ({key}, type_id) "
+                f"VALUES ({self.mark}, {self.mark})",
+                added,
+            )
+
+    def mark_table_changed(self, cursor, table_name):
+        """Bump data_version so the API drops its cached results for the table."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        conflict = (
+            "ON DUPLICATE KEY UPDATE"
+            if self.dialect == "mysql"
+            else "ON CONFLICT (table_name) DO UPDATE SET"
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO data_version (table_name, version, updated_at)
+            VALUES ({self.mark}, 1, {self.mark})
+            {conflict} version = version + 1, updated_at = {self.mark}
+            """,
+            (table_name, now, now),
+        )
@@ -0,0 +1,62 @@
+# places_cache.py
+"""On-disk cache of Places API responses, kept in one SQLite file.
+
+Entries are JSON values keyed by a logical request ("textsearch:<query>",
+"details:<place_id>:<fields>") rather than by URL, so they stay valid after
+the page tokens and API key in the URL have changed.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+
+class PlacesCache:
+    """Thread-safe key -> JSON value store with a per-lookup TTL.
+
+    offline serves every entry whatever its age, for runs that replay a
+    cache without network access.
+    """
+
+    def __init__(self, path, offline=False):
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response (
+                key TEXT PRIMARY KEY,
+                fetched_at REAL NOT NULL,
+                body TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, key, ttl):
+        """The value stored under key if it is under ttl seconds old, else None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fetched_at, body FROM response WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (not self.offline and time.time() - row[0] > ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[1])
+
+    def put(self, key, value):
+        body = json.dumps(value)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO response (key, fetched_at, body) VALUES (?, ?, ?)",
+                (key, time.time(), body),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
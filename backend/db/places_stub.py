@@ -0,0 +1,160 @@
+# places_stub.py
+"""Local stand-in for the Places Text Search and Details endpoints.
+
+Answers with deterministic fake places after a fixed latency, so the
+scraper's throughput can be measured offline:
+
+    python places_stub.py --port 8765 --latency 0.2 &
+    PLACES_API_URL=http://127.0.0.1:8765 python data_scraping.py --dry-run
+
+GET /stats reports the requests served and the busiest second seen.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 20
+
+
+class PlacesStub(ThreadingHTTPServer):
+    """HTTP server holding the stub's settings and request counters.
+
+    pages is how many result pages each search has. token_delay is how long
+    a next_page_token stays inactive (INVALID_REQUEST until then). With qps
+    set, requests beyond it within one second get OVER_QUERY_LIMIT.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, pages=3, token_delay=0.0, qps=None):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.pages = pages
+        self.token_delay = token_delay
+        self.qps = qps
+        self.lock = threading.Lock()
+        self.counts = Counter()  # endpoint -> requests served
+        self.per_second = Counter()  # whole second -> requests
+        self.tokens = {}  # token -> (query, page, time it becomes valid)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": dict(self.counts),
+                "busiest_second": max(self.per_second.values(), default=0),
+            }
+
+
+def fake_place(query, page, index):
+    digest = hashlib.sha1(f"{query}|{page}|{index}".encode()).hexdigest()
+    seed = int(digest[:8], 16)
+    return {
+        "place_id": f"stub-{digest[:20]}",
+        "name": f"{query.title()} {page * PAGE_SIZE + index + 1}",
+        "formatted_address": f"{seed % 9000 + 100} Main St",
+        "geometry": {
+            "location": {
+                "lat": 25 + (seed % 2400) / 100,
+                "lng": -124 + (seed // 2400 % 5700) / 100,
+            }
+        },
+        "rating": round(1 + (seed % 40) / 10, 1),
+        "types": ["point_of_interest", "establishment"],
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # one line per request would drown the scraper's output
+
+    def send_json(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        server = self.server
+        if url.path == "/stats":
+            return self.send_json(server.stats())
+
+        endpoint = url.path.strip("/").split("/")[0]
+        now = time.monotonic()
+        with server.lock:
+            server.counts[endpoint] += 1
+            server.per_second[int(now)] += 1
+            over_quota = server.qps and server.per_second[int(now)] > server.qps
+        time.sleep(server.latency)
+        if over_quota:
+            return self.send_json({"status": "OVER_QUERY_LIMIT"})
+        if endpoint == "textsearch":
+            return self.send_json(self.text_search(params, now))
+        if endpoint == "details":
+            return self.send_json(self.details(params))
+        self.send_error(404)
+
+    def text_search(self, params, now):
+        server = self.server
+        if "pagetoken" in params:
+            with server.lock:
+                entry = server.tokens.get(params["pagetoken"])
+            if entry is None or now < entry[2]:
+                return {"status": "INVALID_REQUEST"}
+            query, page = entry[0], entry[1]
+        else:
+            query, page = params.get("query", ""), 0
+        body = {
+            "status": "OK",
+            "results": [fake_place(query, page, i) for i in range(PAGE_SIZE)],
+        }
+        if page + 1 < server.pages:
+            token = hashlib.sha1(f"{query}|{page + 1}".encode()).hexdigest()
+            with server.lock:
+                server.tokens[token] = (query, page + 1, now + server.token_delay)
+            body["next_page_token"] = token
+        return body
+
+    def details(self, params):
+        place_id = params.get("place_id", "")
+        fields = params.get("fields", "").split(",")
+        result = {
+            "formatted_phone_number": f"(555) 010-{int(place_id[-4:], 16) % 10000:04d}",
+            "website": f"https://example.org/{place_id}",
+            "photos": [{"photo_reference": f"photo-{place_id}"}],
+        }
+        # refreshes ask for the Text Search fields too
+        place = fake_place(place_id, 0, 0)
+        result.update({k: v for k, v in place.items() if k in fields})
+        return {"status": "OK", "result": result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--token-delay", type=float, default=2.0)
+    parser.add_argument("--qps", type=int, default=None)
+    args = parser.parse_args()
+    server = PlacesStub(
+        ("127.0.0.1", args.port),
+        latency=args.latency,
+        pages=args.pages,
+        token_delay=args.token_delay,
+        qps=args.qps,
+    )
+    print(f"Places stub on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# geo_index.py
+"""In-memory grid index over lat/lng points.
+
+Serves /api/nearby, filter[bbox] and cluster= on the list endpoints.
+"""
+import heapq
+import math
+import threading
+from collections import Counter, defaultdict
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """Points bucketed into cells of cell_deg x cell_deg degrees.
+
+    Nearest-neighbour queries visit rings of cells outward from the query
+    point and stop once no unvisited cell can hold anything closer than the
+    k-th hit. Longitudes do not wrap around the antimeridian.
+    """
+
+    def __init__(self, cell_deg=0.25):
+        self.cell_deg = cell_deg
+        # (row, col) -> {doc_id: (lat, lng, label)}
+        self.cells = defaultdict(dict)
+        self.points = {}  # doc_id -> (row, col)
+        # (min row, max row, min col, max col) ever occupied; never shrinks
+        self.extent = None
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.points)
+
+    def cell_of(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def add(self, doc_id, lat, lng, label=None):
+        """Index a point; label (e.g. a category) is what clusters report."""
+        with self.lock:
+            self.remove(doc_id)
+            if lat is None or lng is None:
+                return
+            cell = self.cell_of(lat, lng)
+            self.cells[cell][doc_id] = (lat, lng, label)
+            self.points[doc_id] = cell
+            row, col = cell
+            if self.extent is None:
+                self.extent = (row, row, col, col)
+            else:
+                low_row, high_row, low_col, high_col = self.extent
+                self.extent = (
+                    min(low_row, row),
+                    max(high_row, row),
+                    min(low_col, col),
+                    max(high_col, col),
+                )
+
+    def remove(self, doc_id):
+        with self.lock:
+            cell = self.points.pop(doc_id, None)
+            if cell is None:
+                return
+            bucket = self.cells[cell]
+            bucket.pop(doc_id, None)
+            if not bucket:
+                del self.cells[cell]
+
+    def _ring(self, center, radius):
+        """Cells at Chebyshev distance radius from center."""
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield (row - radius, c)
+            yield (row + radius, c)
+        for r in range(row - radius + 1, row + radius):
+            yield (r, col - radius)
+            yield (r, col + radius)
+
+    def _min_distance_km(self, lat, ring):
+        """Lower bound on the distance to any cell ring or more cells away.
+
+        Such a cell is at least ring - 1 whole cells off in latitude or in
+        longitude. Haversine gives sin(d/2) >= cos(lat) * sin(dlng/2), taken
+        at the latitude farthest from the equator that the cell could be at.
+        """
+        gap = math.radians(min(180.0, max(0, ring - 1) * self.cell_deg))
+        far_lat = min(90.0, abs(lat) + (ring + 1) * self.cell_deg)
+        chord = math.cos(math.radians(far_lat)) * math.sin(gap / 2)
+        return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord))
+
+    def nearest(self, lat, lng, k, radius_km=None):
+        """The k closest points as [(distance_km, doc_id)], closest first."""
+        with self.lock:
+            if not self.cells or k <= 0:
+                return []
+            center = self.cell_of(lat, lng)
+            best = []  # max-heap of (-distance, -doc_id) holding the k closest
+
+            def visit(cell):
+                for doc_id, (plat, plng, _) in self.cells.get(cell, {}).items():
+                    distance = haversine_km(lat, lng, plat, plng)
+                    if radius_km is not None and distance > radius_km:
+                        continue
+                    entry = (-distance, -doc_id)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+
+            low_row, high_row, low_col, high_col = self.extent
+            last_ring = max(
+                abs(center[0] - low_row),
+                abs(center[0] - high_row),
+                abs(center[1] - low_col),
+                abs(center[1] - high_col),
+            )
+            ring = 0
+            while ring <= last_ring:
+                if (2 * ring + 1) ** 2 > len(self.cells):
+                    # rings are now mostly empty, visit the occupied cells left
+                    for cell in list(self.cells):
+                        distance = max(
+                            abs(cell[0] - center[0]), abs(cell[1] - center[1])
+                        )
+                        if distance >= ring:
+                            visit(cell)
+                    break
+                for cell in self._ring(center, ring):
+                    visit(cell)
+                ring += 1
+                bound = self._min_distance_km(lat, ring)
+                if radius_km is not None and bound > radius_km:
+                    break
+                if len(best) == k and -best[0][0] <= bound:
+                    break
+            return sorted((-distance, -doc_id) for distance, doc_id in best)
+
+    def _cells_in(self, min_lat, min_lng, max_lat, max_lng):
+        """Occupied cells overlapping the box."""
+        low_row, low_col = self.cell_of(min_lat, min_lng)
+        high_row, high_col = self.cell_of(max_lat, max_lng)
+        if (high_row - low_row + 1) * (high_col - low_col + 1) > len(self.cells):
+            return [
+                cell
+                for cell in self.cells
+                if low_row <= cell[0] <= high_row and low_col <= cell[1] <= high_col
+            ]
+        return [
+            (row, col)
+            for row in range(low_row, high_row + 1)
+            for col in range(low_col, high_col + 1)
+            if (row, col) in self.cells
+        ]
+
+    def within(self, min_lat, min_lng, max_lat, max_lng):
+        """Yield (doc_id, lat, lng, label) for every point inside the box."""
+        with self.lock:
+            for cell in self._cells_in(min_lat, min_lng, max_lat, max_lng):
+                for doc_id, (lat, lng, label) in self.cells[cell].items():
+                    if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                        yield doc_id, lat, lng, label
+
+    def clusters(self, min_lat, min_lng, max_lat, max_lng, cell_deg, keep=None):
+        """Group the points inside the box into cell_deg x cell_deg cells.
+
+        Returns {(row, col): (count, mean lat, mean lng, most common label)}.
+        keep, if given, is the set of doc ids allowed to count.
+        """
+        groups = defaultdict(lambda: [0, 0.0, 0.0, Counter()])
+        for doc_id, lat, lng, label in list(
+            self.within(min_lat, min_lng, max_lat, max_lng)
+        ):
+            if keep is not None and doc_id not in keep:
+                continue
+            group = groups[(math.floor(lat / cell_deg), math.floor(lng / cell_deg))]
+            group[0] += 1
+            group[1] += lat
+            group[2] += lng
+            group[3][label] += 1
+        return {
+            cell: (count, lat / count, lng / count, labels.most_common(1)[0][0])
+            for cell, (count, lat, lng, labels) in groups.items()
+        }
@@ -0,0 +1,83 @@
+# highlight.py
+"""Single-pass search highlighting for serialized API items."""
+import re
+
+
+class Highlighter:
+    """Finds the phrase and terms of one search inside serialized items.
+
+    The phrase and terms are compiled once into a single case-insensitive
+    alternation, longest first, so every string is scanned exactly once.
+    A term inside a phrase occurrence is covered by the phrase and is not
+    reported again.
+    """
+
+    def __init__(self, search_query, terms):
+        self.phrase = search_query or None
+        labels = []
+        seen = set()
+        if self.phrase:
+            labels.append(self.phrase)
+            seen.add(self.phrase.lower())
+        self.terms = []
+        for term in terms:
+            if term.lower() not in seen:
+                seen.add(term.lower())
+                labels.append(term)
+                self.terms.append(term)
+        self.labels = sorted(labels, key=len, reverse=True)
+        self.regex = None
+        if self.labels:
+            self.regex = re.compile(
+                "|".join(f"({re.escape(label)})" for label in self.labels),
+                re.IGNORECASE,
+            )
+
+    def scan(self, text):
+        """Match entries for one string: phrase hits first, then each term."""
+        phrase_hits = []
+        term_hits = {}
+        labels = self.labels
+        for m in self.regex.finditer(text):
+            label = labels[m.lastindex - 1]
+            if label is self.phrase:
+                phrase_hits.append({"term": label, "indices": [m.span()]})
+            elif label in term_hits:
+                term_hits[label].append(m.span())
+            else:
+                term_hits[label] = [m.span()]
+        if not term_hits:
+            return phrase_hits
+        return phrase_hits + [
+            {"term": term, "indices": term_hits[term]}
+            for term in self.terms
+            if term in term_hits
+        ]
+
+    def matches(self, item, fields=None):
+        """Map each string path in item (".name", ".x[0].y") to its hits.
+
+        fields limits the scan to those top-level keys of item.
+        """
+        matches = {}
+        if self.regex is None:
+            return matches
+        scan = self.scan
+
+        def walk(path, value):
+            if isinstance(value, str):
+                found = scan(value)
+                if found:
+                    matches[path] = found
+            elif isinstance(value, list):
+                for i, entry in enumerate(value):
+                    walk(f"{path}[{i}]", entry)
+            elif isinstance(value, dict):
+                for k, v in value.items():
+                    walk(f"{path}.{k}", v)
+            # numbers, None, bool, etc. are ignored
+
+        for key, value in item.items():
+            if fields is None or key in fields:
+                walk(f".{key}", value)
+        return matches
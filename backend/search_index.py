@@ -0,0 +1,150 @@
+# search_index.py
+"""In-memory inverted index with BM25 ranking, used by /api/search_all."""
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Score added when the whole query appears as a phrase, on top of BM25
+PHRASE_BOOST = 10.0
+# Most vocabulary entries a single query term may expand to as a prefix
+MAX_EXPANSIONS = 50
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class SearchIndex:
+    """Positional inverted index over a set of documents.
+
+    Each document is a list of field texts. Positions restart with a gap at
+    every field so a phrase never matches across two fields.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # token -> {doc_id: [positions]}
+        self.doc_lengths = {}
+        self.doc_tokens = {}
+        self.total_length = 0
+        self._vocabulary = None  # sorted tokens, rebuilt lazily after writes
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, doc_id, texts):
+        with self.lock:
+            self.remove(doc_id)
+            position = 0
+            tokens = set()
+            for text in texts:
+                if not text:
+                    continue
+                for token in tokenize(text):
+                    self.postings[token].setdefault(doc_id, []).append(position)
+                    tokens.add(token)
+                    position += 1
+                position += 1
+            self.doc_lengths[doc_id] = position
+            self.doc_tokens[doc_id] = tokens
+            self.total_length += position
+            self._vocabulary = None
+
+    def remove(self, doc_id):
+        with self.lock:
+            if doc_id not in self.doc_lengths:
+                return
+            for token in self.doc_tokens.pop(doc_id):
+                postings = self.postings[token]
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[token]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            self._vocabulary = None
+
+    def expand(self, term):
+        """Vocabulary tokens starting with term, so "hous" finds "housing"."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, term)
+        expansions = []
+        for token in vocabulary[start : start + MAX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            expansions.append(token)
+        return expansions
+
+    def _matching_docs(self, term):
+        """{doc_id: [positions]} for every token the term expands to."""
+        docs = {}
+        for token in self.expand(term):
+            for doc_id, positions in self.postings[token].items():
+                docs.setdefault(doc_id, []).extend(positions)
+        return docs
+
+    def _phrase_docs(self, tokens):
+        """Documents containing tokens at consecutive positions."""
+        if len(tokens) == 1:
+            return set(self._matching_docs(tokens[0]))
+        postings = [self.postings.get(token, {}) for token in tokens]
+        # intersect from the rarest token so the candidate set starts small
+        candidates = set(min(postings, key=len))
+        for docs in sorted(postings, key=len):
+            candidates &= docs.keys()
+            if not candidates:
+                return candidates
+        found = set()
+        for doc_id in candidates:
+            starts = set(postings[0][doc_id])
+            for offset, docs in enumerate(postings[1:], 1):
+                starts &= {p - offset for p in docs[doc_id]}
+            if starts:
+                found.add(doc_id)
+        return found
+
+    def search(self, phrase, terms, k):
+        """Rank documents for a query.
+
+        Documents match on any term; those containing every term rank ahead
+        of partial matches, then by BM25 plus PHRASE_BOOST for a phrase hit.
+        Returns the total number of matches and the top k as
+        [(matched terms, score, doc_id)], best first, so lists from several
+        indexes can be merged on the same key.
+        """
+        with self.lock:
+            count = len(self.doc_lengths)
+            if not count:
+                return 0, []
+            avg_length = self.total_length / count
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for term in dict.fromkeys(t.lower() for t in terms):
+                docs = self._matching_docs(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, positions in docs.items():
+                    tf = len(positions)
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length
+                    )
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[doc_id] += 1
+            phrase_tokens = tokenize(phrase) if phrase else []
+            if phrase_tokens:
+                for doc_id in self._phrase_docs(phrase_tokens):
+                    scores[doc_id] += PHRASE_BOOST
+            top = heapq.nlargest(
+                k, scores.items(), key=lambda hit: (matched[hit[0]], hit[1], -hit[0])
+            )
+            return len(scores), [
+                (matched[doc_id], score, doc_id) for doc_id, score in top
+            ]
@@ -1,51 +1,44 @@
 # setup_db.py
-from app import app, db, Housing, Counseling, Organizations, State
+import sys
 
+from app import app, db
+from app import mark_tables_changed, ensure_fulltext_indexes, ensure_indexes
+from app import link_states, linked_id_floors, sync_resource_types
 
-def setup_database():
+
+def setup_database(incremental=False):
+    """Create tables and indexes, then link rows to their states and types.
+
+    incremental only links rows added since the last run: both syncs skip
+    the ids at or below the watermark taken before linking starts.
+    """
     with app.app_context():
         print("Setting up database...")
         db.create_all()
+        ensure_fulltext_indexes()
+        created_indexes = ensure_indexes()
+        if created_indexes:
+            print(f"Added indexes: {created_indexes}")
 
-        # collect all missing state names
-        all_states = set()
-        for model in [Housing, Counseling, Organizations]:
-            instances = model.query.all()
-            for instance in instances:
-                state_name = instance.state.strip() if instance.state else "Unknown"
-                all_states.add(state_name)
-
-        # create missing states
-        created_states = []
-        for state_name in all_states:
-            existing_state = State.query.filter_by(name=state_name).first()
-            if not existing_state:
-                new_state = State(name=state_name)
-                db.session.add(new_state)
-                created_states.append(state_name)
-        db.session.commit()
+        floors = linked_id_floors() if incremental else None
 
+        # missing states and the *_state links, a few statements in all
+        created_states, linked_count = link_states(floors=floors)
         if created_states:
             print(f"Added new states: {created_states}")
         else:
             print("ℹNo new states added (already up to date).")
-
-        # create links between models
-        linked_count = 0
-        for model in [Housing, Counseling, Organizations]:
-            instances = model.query.all()
-            for instance in instances:
-                state_name = instance.state.strip() if instance.state else "Unknown"
-                state_obj = State.query.filter_by(name=state_name).first()
-                if state_obj and state_obj not in instance.states:
-                    instance.states.append(state_obj)
-                    db.session.add(instance)
-                    linked_count += 1
-
-        db.session.commit()
         print(f"Linked {linked_count} records to their state(s).")
+
+        # normalize the types JSON into resource_type and the *_type links
+        type_links = sync_resource_types(floors)
+        print(f"Updated {type_links} resource type link(s).")
+
+        # let running API workers drop their cached results
+        if created_states or linked_count or type_links:
+            mark_tables_changed("state", "housing", "counseling", "organizations")
         print("Database setup complete!")
 
 
 if __name__ == "__main__":
-    setup_database()
+    setup_database(incremental="--incremental" in sys.argv[1:])
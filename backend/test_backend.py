@@ -1,8 +1,29 @@
 import pytest
 import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import datetime
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlparse
+from sqlalchemy import create_engine, event, text
 
 os.environ["RUNNING_TESTS"] = "1"
+import app as app_module
 from app import app, db, Housing, Counseling, Organizations, State
+from app import clear_caches, mark_tables_changed, sync_resource_types
+from app import ensure_indexes, link_states, linked_id_floors
+from search_index import SearchIndex
+from highlight import Highlighter
+import serializer
+
+# the scraper scripts in db/ import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "db"))
+from place_writer import Checkpoint, PlaceWriter
+from places_cache import PlacesCache
+from places_stub import PlacesStub
 
 
 @pytest.fixture
@@ -11,6 +32,8 @@ def client():
     app.config["TESTING"] = True
     # Create app context
     with app.app_context():
+        # Fresh database, so nothing cached from an earlier test applies
+        clear_caches()
         # Create all tables
         db.create_all()
         # Insert initial test data
@@ -83,6 +106,1185 @@ def test_get_housing_all(client):
     assert second_house["category"] == "Shelter"
 
 
+def test_get_housing_pagination(client):
+    """Test /api/housing paging is applied in the database"""
+    response = client.get("/api/housing?page[number]=2&page[size]=1")
+    assert response.status_code == 200
+    json_data = response.get_json()
+
+    # total still counts every row, only one row is returned
+    assert json_data["meta"]["total"] == 2
+    assert len(json_data["data"]) == 1
+    assert json_data["data"][0]["attributes"]["name"] == "Housing B"
+    assert json_data["links"]["prev"] is not None
+    assert json_data["links"]["next"] is None
+
+    # filtered totals are counted separately from the unfiltered ones
+    response = client.get("/api/housing?filter[state]=Ohio")
+    json_data = response.get_json()
+    assert json_data["meta"]["total"] == 1
+    assert json_data["data"][0]["attributes"]["name"] == "Housing B"
+
+    # malformed page parameters are a client error, not a crash
+    for url in [
+        "/api/housing?page[size]=abc",
+        "/api/housing?page[number]=x",
+        "/api/search_all?search=Housing&page[size]=abc",
+    ]:
+        response = client.get(url)
+        assert response.status_code == 400, url
+        assert "must be an integer" in response.get_json()["error"]
+
+
+def cursor_from(link):
+    """Pull the opaque page[cursor] value out of a pagination link"""
+    query = parse_qs(urlparse(link).query)
+    return query["page[cursor]"][0]
+
+
+def test_get_housing_cursor_pagination(client):
+    """Test /api/housing keyset paging with page[cursor]"""
+    with app.app_context():
+        db.session.add_all(
+            [
+                Housing(name="Housing C", category="Shelter", rating=4.5, place_id="h3"),
+                Housing(name="Housing D", category="Shelter", rating=3.0, place_id="h4"),
+            ]
+        )
+        db.session.commit()
+
+    # walk every page sorted by rating (NULL ratings included)
+    seen = []
+    cursor = ""
+    while True:
+        response = client.get(
+            f"/api/housing?sort=-rating&page[size]=1&page[cursor]={cursor}"
+        )
+        assert response.status_code == 200
+        json_data = response.get_json()
+        assert len(json_data["data"]) == 1
+        seen.append(json_data["data"][0]["attributes"]["name"])
+        if len(seen) == 1:
+            # a row inserted mid-walk must not shift the pages already seen
+            with app.app_context():
+                db.session.add(
+                    Housing(name="Housing E", category="Shelter", place_id="h5")
+                )
+                db.session.commit()
+        if json_data["links"]["next"] is None:
+            break
+        cursor = cursor_from(json_data["links"]["next"])
+    # NULL ratings sort last, ties broken by id in the same direction
+    assert seen == ["Housing C", "Housing D", "Housing E", "Housing B", "Housing A"]
+
+    # the prev link walks back to the page before
+    response = client.get(f"/api/housing?sort=-rating&page[size]=1&page[cursor]={cursor}")
+    prev_cursor = cursor_from(response.get_json()["links"]["prev"])
+    response = client.get(
+        f"/api/housing?sort=-rating&page[size]=1&page[cursor]={prev_cursor}"
+    )
+    assert response.get_json()["data"][0]["attributes"]["name"] == "Housing B"
+
+    # cursors are tied to their sort and must be well formed
+    response = client.get(f"/api/housing?sort=name&page[cursor]={cursor}")
+    assert response.status_code == 400
+    response = client.get("/api/housing?page[cursor]=not-a-cursor")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid page cursor"
+
+
+@contextmanager
+def count_queries(with_parameters=False):
+    """Count the SQL statements run inside the block"""
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        # data_version polls run on a timer, not per request
+        if "data_version" not in statement:
+            statements.append((statement, parameters) if with_parameters else statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_execute)
+
+
+def test_in_state_resources_query_count(client):
+    """Test related resources are loaded per page, not per row"""
+    with app.app_context():
+        texas = State.query.filter_by(name="Texas").first()
+        for i in range(8):
+            housing = Housing(
+                name=f"Housing Extra {i}", category="Shelter", place_id=f"hx{i}"
+            )
+            housing.states.append(texas)
+            db.session.add(housing)
+        db.session.commit()
+
+    # count + page rows + state ids + one query per related model
+    clear_caches()
+    with count_queries() as statements:
+        response = client.get("/api/housing?page[size]=10")
+    assert response.status_code == 200
+    assert len(response.get_json()["data"]) == 10
+    assert len(statements) == 5
+
+    first = response.get_json()["data"][0]["attributes"]
+    assert [c["name"] for c in first["in_state_resources"]["counseling"]] == [
+        "Counseling A"
+    ]
+
+    # with the count and per-state lists cached: page rows + state ids
+    with count_queries() as statements:
+        response = client.get("/api/housing?page[size]=10")
+    assert len(statements) == 2
+
+    # search_all: hits + state ids + related models, for each of three models
+    with count_queries() as statements:
+        response = client.get("/api/search_all?search=Housing")
+    assert response.status_code == 200
+    assert len(statements) <= 12
+
+
+def test_state_cache_invalidation(client, monkeypatch):
+    """Test cached in_state_resources follow writes from other processes"""
+    monkeypatch.setattr(app_module, "DATA_VERSION_POLL", 0)
+    response = client.get("/api/housing-resources/1")
+    assert len(response.get_json()["in_state_resources"]["counseling"]) == 1
+
+    # a write outside the ORM (like the scraper's) is not seen on its own
+    with app.app_context():
+        texas = State.query.filter_by(name="Texas").first()
+        with db.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO counseling (id, name, category, state, place_id) "
+                    "VALUES (3, 'Counseling C', 'Mental Health', 'Texas', 'c3')"
+                )
+            )
+            conn.execute(
+                text("INSERT INTO counseling_state VALUES (3, :state)"),
+                {"state": texas.id},
+            )
+    response = client.get("/api/housing-resources/1")
+    assert len(response.get_json()["in_state_resources"]["counseling"]) == 1
+
+    # once the writer bumps data_version the cached list is rebuilt
+    with app.app_context():
+        mark_tables_changed("counseling")
+    with count_queries() as statements:
+        response = client.get("/api/housing-resources/1")
+    names = [c["name"] for c in response.get_json()["in_state_resources"]["counseling"]]
+    assert names == ["Counseling A", "Counseling C"]
+    # only the stale list is reloaded, organizations still come from cache
+    assert not any("organization_state" in s for s in statements)
+
+
+def test_related_lists(client):
+    """Test detail routes page, order and count each related list"""
+    with app.app_context():
+        texas = State.query.filter_by(name="Texas").first()
+        housing = db.session.get(Housing, 1)
+        housing.lat, housing.lng = 30.27, -97.74
+        for i, (rating, lat) in enumerate([(3.0, 32.0), (5.0, 30.5), (4.0, None)]):
+            counseling = Counseling(
+                name=f"Counseling Extra {i}",
+                category="Mental Health",
+                place_id=f"cx{i}",
+                rating=rating,
+                lat=lat,
+                lng=None if lat is None else -97.74,
+            )
+            counseling.states.append(texas)
+            db.session.add(counseling)
+        db.session.commit()
+
+    def related(url):
+        item = client.get(url).get_json()
+        return (
+            [c["name"] for c in item["in_state_resources"]["counseling"]],
+            item["in_state_counts"],
+        )
+
+    # counseling ids 1, 3, 4, 5 are in Texas
+    assert related("/api/housing-resources/1") == (
+        [
+            "Counseling A",
+            "Counseling Extra 0",
+            "Counseling Extra 1",
+            "Counseling Extra 2",
+        ],
+        {"counseling": 4, "organizations": 1},
+    )
+    assert related(
+        "/api/housing-resources/1?related[counseling][limit]=2"
+        "&related[counseling][offset]=1"
+    ) == (
+        ["Counseling Extra 0", "Counseling Extra 1"],
+        {"counseling": 4, "organizations": 1},
+    )
+
+    # other orders page in SQL and share one aggregate query for the totals
+    clear_caches()
+    with count_queries() as statements:
+        names, totals = related(
+            "/api/housing-resources/1?related[counseling][sort]=-rating"
+            "&related[counseling][limit]=2"
+        )
+    assert names == ["Counseling Extra 1", "Counseling Extra 2"]
+    assert totals == {"counseling": 4, "organizations": 1}
+    # state ids + counseling page + organizations from the state cache + the
+    # count; the row itself is still in the session
+    assert len(statements) == 4
+
+    item = client.get(
+        "/api/housing-resources/1?related[counseling][sort]=distance"
+    ).get_json()
+    nearest = item["in_state_resources"]["counseling"]
+    assert [c["name"] for c in nearest] == [
+        "Counseling Extra 1",
+        "Counseling Extra 0",
+        "Counseling A",
+        "Counseling Extra 2",
+    ]
+    assert 20 < nearest[0]["distance_km"] < 30
+    assert nearest[-1]["distance_km"] is None
+
+    # a row in several states gets their merged lists, each row once
+    with app.app_context():
+        ohio = State.query.filter_by(name="Ohio").first()
+        for row in [db.session.get(Housing, 1), db.session.get(Counseling, 1)]:
+            row.states.append(ohio)
+        db.session.commit()
+    url = "/api/housing-resources/1?related[counseling][limit]=3"
+    assert related(url) == (
+        ["Counseling A", "Counseling B", "Counseling Extra 0"],
+        {"counseling": 5, "organizations": 2},
+    )
+    # the merge is cached: only the row's state ids are read again
+    with count_queries() as statements:
+        assert related(url)[1] == {"counseling": 5, "organizations": 2}
+    assert len(statements) == 1
+
+    for args in [
+        "related[shelters][limit]=1",
+        "related[counseling][page]=1",
+        "related[counseling][limit]=x",
+        "related[counseling][limit]=501",
+        "related[counseling][offset]=-1",
+        "related[counseling][sort]=name",
+    ]:
+        response = client.get(f"/api/housing-resources/1?{args}")
+        assert response.status_code == 400, args
+
+
+def test_sparse_fieldsets(client):
+    """Test fields[<type>] and include/exclude=in_state_resources"""
+    with count_queries() as statements:
+        response = client.get("/api/housing?fields[housing]=name,rating,state")
+    assert response.status_code == 200
+    attributes = response.get_json()["data"][0]["attributes"]
+    assert set(attributes) == {"name", "rating", "state", "matches"}
+    # the projection reaches the SELECT and related lists are skipped
+    assert not any("photo_url" in s for s in statements)
+    assert not any("counseling_state" in s for s in statements)
+
+    # include brings the related lists back alongside the fieldset
+    response = client.get(
+        "/api/housing?fields[housing]=name&include=in_state_resources"
+    )
+    attributes = response.get_json()["data"][0]["attributes"]
+    assert "counseling" in attributes["in_state_resources"]
+
+    response = client.get("/api/counseling/1?exclude=in_state_resources")
+    json_data = response.get_json()
+    assert json_data["name"] == "Counseling A"
+    assert "in_state_resources" not in json_data
+
+    response = client.get("/api/search_all?search=Org&fields[organizations]=name")
+    attributes = response.get_json()["data"][0]["attributes"]
+    assert set(attributes) == {"name", "matches"}
+
+    response = client.get("/api/housing?fields[housing]=name,bogus")
+    assert response.status_code == 400
+    assert "bogus" in response.get_json()["error"]
+
+
+def test_search_index_ranking():
+    """Test BM25 ranking, phrase boost and prefix expansion of SearchIndex"""
+    index = SearchIndex()
+    index.add(1, ["Youth Shelter", "Austin Texas"])
+    index.add(2, ["Shelter for youth", "Dallas Texas"])
+    index.add(3, ["Food Bank", "Texas"])
+    index.add(4, ["Youth Center", None])
+
+    total, top = index.search("youth shelter", ["youth", "shelter"], 2)
+    assert total == 3
+    # both terms beat one term, the exact phrase beats both terms
+    assert [doc_id for _, _, doc_id in top] == [1, 2]
+    assert [matched for matched, _, _ in top] == [2, 2]
+
+    # terms match as prefixes
+    total, top = index.search("shel", ["shel"], 10)
+    assert {doc_id for _, _, doc_id in top} == {1, 2}
+
+    # phrases never span two fields
+    total, top = index.search("shelter austin", ["shelter", "austin"], 10)
+    assert top[0][1] < 10
+
+    index.remove(1)
+    total, top = index.search("youth", ["youth"], 10)
+    assert {doc_id for _, _, doc_id in top} == {2, 4}
+
+
+def test_search_all_index_merge(client):
+    """Test search_all ranks hits with every term first across models"""
+    with app.app_context():
+        db.session.add_all(
+            [
+                # one term, but a rare one among organizations: a high score
+                Organizations(
+                    name="Shelter Alliance", category="Support", place_id="o3"
+                ),
+                # both terms, each worth little in a long housing record
+                Housing(
+                    name="Youth Group Homes and Family Shelter of the County",
+                    category="Transitional Housing Program",
+                    place_id="h3",
+                ),
+            ]
+        )
+        db.session.commit()
+    response = client.get("/api/search_all?search=youth shelter&page[size]=10")
+    names = [item["attributes"]["name"] for item in response.get_json()["data"]]
+    assert names[:2] == [
+        "Youth Group Homes and Family Shelter of the County",
+        "Shelter Alliance",
+    ]
+    assert set(names[2:]) == {"Housing A", "Housing B"}
+
+
+def test_search_all_index_updates(client):
+    """Test search_all sees committed writes without a full rebuild"""
+    response = client.get("/api/search_all?search=hostel")
+    assert response.get_json()["meta"]["total"] == 0
+
+    with app.app_context():
+        db.session.add(
+            Housing(
+                name="Youth Hostel", category="Shelter", state="Texas", place_id="h9"
+            )
+        )
+        db.session.commit()
+    with count_queries() as statements:
+        response = client.get("/api/search_all?search=hostel")
+    json_data = response.get_json()
+    assert json_data["meta"]["total"] == 1
+    assert json_data["data"][0]["attributes"]["name"] == "Youth Hostel"
+    # no rebuild: the index was updated when the insert committed
+    assert not any("FROM housing" in s and "WHERE" not in s for s in statements)
+
+    # the LIKE backend answers the same query the same way
+    app.config["SEARCH_BACKEND"] = "like"
+    try:
+        response = client.get("/api/search_all?search=hostel")
+    finally:
+        app.config["SEARCH_BACKEND"] = "index"
+    names = [item["attributes"]["name"] for item in response.get_json()["data"]]
+    assert names == ["Youth Hostel"]
+
+
+def test_fulltext_search(client):
+    """Test ?search= on list endpoints through the FTS5 shadow table"""
+    with app.app_context():
+        db.session.add(
+            Housing(
+                name="Transitional Housing B Annex",
+                category="Shelter",
+                state="Ohio",
+                place_id="h3",
+            )
+        )
+        db.session.commit()
+        # updates reach the full-text index through its triggers
+        housing = db.session.get(Housing, 1)
+        housing.address = "12 Annex Road"
+        db.session.commit()
+
+    with count_queries() as statements:
+        response = client.get("/api/housing?search=annex")
+    assert any("housing_fts MATCH" in s for s in statements)
+    assert not any("LIKE" in s for s in statements)
+    names = [item["attributes"]["name"] for item in response.get_json()["data"]]
+    assert sorted(names) == ["Housing A", "Transitional Housing B Annex"]
+
+    # the exact phrase ranks first, terms match as prefixes
+    response = client.get("/api/housing?search=Housing B Ann")
+    names = [item["attributes"]["name"] for item in response.get_json()["data"]]
+    assert names[0] == "Transitional Housing B Annex"
+
+    # an explicit sort still wins over relevance
+    response = client.get("/api/housing?search=annex&sort=-name")
+    names = [item["attributes"]["name"] for item in response.get_json()["data"]]
+    assert names == ["Transitional Housing B Annex", "Housing A"]
+
+    # search_all can use the same index
+    app.config["SEARCH_BACKEND"] = "fulltext"
+    try:
+        response = client.get("/api/search_all?search=Counseling A")
+    finally:
+        app.config["SEARCH_BACKEND"] = "index"
+    assert response.get_json()["data"][0]["attributes"]["name"] == "Counseling A"
+
+    # the LIKE fallback is still selectable
+    app.config["LIST_SEARCH_BACKEND"] = "like"
+    try:
+        response = client.get("/api/housing?search=annex")
+    finally:
+        app.config["LIST_SEARCH_BACKEND"] = "fulltext"
+    assert response.get_json()["meta"]["total"] == 2
+
+
+def test_highlighter():
+    """Test Highlighter reports phrase and term hits per string path"""
+    highlighter = Highlighter("youth shelter", ["youth", "shelter", "Youth"])
+    item = {
+        "id": 1,
+        "name": "Youth Shelter of Youth",
+        "state": "Texas",
+        "in_state_resources": {"counseling": [{"id": 2, "name": "youth center"}]},
+    }
+    matches = highlighter.matches(item)
+    assert matches[".name"] == [
+        {"term": "youth shelter", "indices": [(0, 13)]},
+        {"term": "youth", "indices": [(17, 22)]},
+    ]
+    assert matches[".in_state_resources.counseling[0].name"] == [
+        {"term": "youth", "indices": [(0, 5)]}
+    ]
+    assert ".state" not in matches
+
+    # callers can restrict the scan to chosen top-level fields
+    assert list(highlighter.matches(item, {"name"})) == [".name"]
+    assert Highlighter("", []).matches(item) == {}
+
+
+def test_highlight_fields(client):
+    """Test highlight= limits matches on list and search endpoints"""
+    response = client.get("/api/counseling?search=Counseling A&highlight=name")
+    matches = response.get_json()["data"][0]["attributes"]["matches"]
+    assert list(matches) == [".name"]
+
+    response = client.get("/api/search_all?search=Texas")
+    matches = response.get_json()["data"][0]["attributes"]["matches"]
+    assert ".state" in matches
+    response = client.get("/api/search_all?search=Texas&highlight=name")
+    assert response.get_json()["data"][0]["attributes"]["matches"] == {}
+
+
+def test_search_all_like_ranking(client):
+    """Test the LIKE backend ranks every model in one UNION ALL query"""
+    app.config["SEARCH_BACKEND"] = "like"
+    try:
+        with count_queries() as statements:
+            response = client.get("/api/search_all?search=Org B&page[size]=1")
+        json_data = response.get_json()
+        # "Org B" holds the whole phrase, "Org A" only the term "Org"
+        assert json_data["data"][0]["attributes"]["name"] == "Org B"
+        # the term "b" also finds "Housing B" and "Counseling B"
+        assert json_data["meta"]["total"] == 4
+        ranking = [s for s in statements if "CASE WHEN" in s]
+        assert len(ranking) == 1
+        assert ranking[0].count("UNION ALL") == 2 and "LIMIT" in ranking[0]
+        # the union already returns the page's columns, nothing is reloaded
+        assert not any("organizations.id IN" in s for s in statements)
+
+        # model= prunes the union down to one branch
+        with count_queries() as statements:
+            response = client.get("/api/search_all?search=a&model=housing")
+        assert {item["type"] for item in response.get_json()["data"]} == {"housing"}
+        assert not any("UNION ALL" in s for s in statements)
+
+        # the total is still known past the last page
+        response = client.get("/api/search_all?search=Org B&page[number]=5")
+        assert response.get_json()["meta"]["total"] == 4
+        assert response.get_json()["data"] == []
+
+        app.config["SEARCH_BACKEND"] = "fulltext"
+        response = client.get("/api/search_all?search=counseling b")
+        json_data = response.get_json()
+        assert json_data["data"][0]["attributes"]["name"] == "Counseling B"
+        assert json_data["data"][0]["type"] == "counseling"
+    finally:
+        app.config["SEARCH_BACKEND"] = "index"
+
+
+def test_search_all_union_fieldsets(client):
+    """Test the UNION ALL search reads only the columns the fieldsets ask for"""
+    app.config["SEARCH_BACKEND"] = "like"
+    try:
+        with count_queries() as statements:
+            response = client.get(
+                "/api/search_all?search=b&fields[housing]=name"
+                "&fields[organizations]=name,phone&fields[counseling]=category"
+            )
+        data = response.get_json()["data"]
+        attributes = {item["type"]: set(item["attributes"]) for item in data}
+        assert attributes == {
+            "housing": {"name", "matches"},
+            "organizations": {"name", "phone", "matches"},
+            "counseling": {"category", "matches"},
+        }
+        ranking = next(s for s in statements if "UNION ALL" in s)
+        # each branch projects its id and the union of the fieldsets only
+        projections = re.findall(r"AS score, (.*?)\s+FROM", ranking, re.S)
+        assert len(projections) == 3
+        for projection in projections:
+            labels = re.findall(r"AS (\w+)", projection)
+            assert labels == ["id", "name", "category", "phone"]
+        # a model without a fieldset still gets every attribute
+        response = client.get("/api/search_all?search=b&fields[housing]=name")
+        for item in response.get_json()["data"]:
+            if item["type"] == "counseling":
+                assert "photo_url" in item["attributes"]
+    finally:
+        app.config["SEARCH_BACKEND"] = "index"
+
+
+def test_conditional_get(client):
+    """Test ETag / Last-Modified revalidation answers 304 without queries"""
+    response = client.get("/api/housing")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert response.headers["Last-Modified"]
+
+    with count_queries() as statements:
+        response = client.get("/api/housing", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert statements == []
+
+    # the validators are tied to the URL
+    response = client.get("/api/housing?page[size]=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    last_modified = client.get("/api/counseling/1").headers["Last-Modified"]
+    response = client.get(
+        "/api/counseling/1", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+
+    # any write moves the validators on
+    with app.app_context():
+        db.session.get(Housing, 1).rating = 5.0
+        db.session.commit()
+    response = client.get("/api/housing", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_streamed_list(client):
+    """Test large pages stream the same document the buffered path builds"""
+    with app.app_context():
+        db.session.add_all(
+            Housing(name=f"Housing {i:03}", category="Shelter", place_id=f"s{i}")
+            for i in range(150)
+        )
+        db.session.commit()
+
+    response = client.get("/api/housing?sort=name&page[size]=100")
+    assert response.status_code == 200
+    # streamed bodies have no length up front
+    assert "Content-Length" not in response.headers
+    streamed = response.get_json()
+    assert len(streamed["data"]) == 100
+    assert streamed["meta"]["total"] == 152
+    assert streamed["links"]["next"] is not None
+
+    # the first 99 rows match a buffered page of the same query
+    response = client.get("/api/housing?sort=name&page[size]=99")
+    assert "Content-Length" in response.headers
+    buffered = response.get_json()
+    assert streamed["data"][:99] == buffered["data"]
+
+    # keyset links are built from the rows that were streamed
+    response = client.get("/api/housing?sort=name&page[size]=100&page[cursor]=")
+    assert response.get_json()["data"] == streamed["data"]
+    cursor = cursor_from(response.get_json()["links"]["next"])
+    response = client.get(f"/api/housing?sort=name&page[size]=100&page[cursor]={cursor}")
+    json_data = response.get_json()
+    assert len(json_data["data"]) == 52
+    assert json_data["data"][0]["attributes"]["name"] == "Housing 100"
+    assert json_data["links"]["next"] is None
+
+    response = client.get("/api/housing?filter[state]=Utah&page[size]=100")
+    assert response.status_code == 404
+
+
+def test_compressed_responses(client):
+    """Test gzip is negotiated for large bodies and streamed pages"""
+    import gzip
+    import json
+
+    with app.app_context():
+        db.session.add_all(
+            Housing(name=f"Housing {i:03}", category="Shelter", place_id=f"s{i}")
+            for i in range(150)
+        )
+        db.session.commit()
+
+    plain = client.get("/api/housing?page[size]=50")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    headers = {"Accept-Encoding": "gzip"}
+    response = client.get("/api/housing?page[size]=50", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.data)) == plain.get_json()
+
+    response = client.get("/api/housing?page[size]=100", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(response.data))["data"]) == 100
+
+    # small bodies and errors are left alone
+    response = client.get("/api/housing-resources/1", headers=headers)
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    response = client.get("/api/housing-resources/999", headers=headers)
+    assert response.status_code == 404
+    assert "Content-Encoding" not in response.headers
+
+
+def test_serializer_encoders(client, monkeypatch):
+    """Test the orjson and stdlib encoders produce the same documents"""
+    with app.app_context():
+        db.session.get(Housing, 1).retrieved_at = datetime.datetime(2025, 10, 1, 12)
+        db.session.commit()
+
+    detail = client.get("/api/housing-resources/1")
+    listing = client.get("/api/housing?fields[housing]=name,retrieved_at")
+    # attributes keep the serializer's order rather than being sorted
+    assert list(detail.get_json())[:3] == ["id", "place_id", "name"]
+    assert detail.get_json()["retrieved_at"] == "2025-10-01T12:00:00"
+    assert listing.get_json()["data"][0]["attributes"] == {
+        "name": "Housing A",
+        "retrieved_at": "2025-10-01T12:00:00",
+        "matches": {},
+    }
+
+    monkeypatch.setattr(serializer, "orjson", None)
+    assert client.get("/api/housing-resources/1").data == detail.data
+    assert (
+        client.get("/api/housing?fields[housing]=name,retrieved_at").data
+        == listing.data
+    )
+
+
+def test_export(client):
+    """Test /api/<model>/export streams filtered rows as NDJSON"""
+    import gzip
+    import json
+
+    response = client.get("/api/housing/export")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [row["name"] for row in rows] == ["Housing A", "Housing B"]
+    # related resources are exported as ids only
+    assert rows[0]["in_state_resources"] == {"counseling": [1], "organizations": [1]}
+
+    # list filters and sparse fieldsets apply, paging does not
+    response = client.get(
+        "/api/counseling/export?filter[state]=Ohio&fields[counseling]=name&page[size]=1"
+    )
+    assert response.data == b'{"id":2,"name":"Counseling B"}\n'
+
+    response = client.get(
+        "/api/organizations/export", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(gzip.decompress(response.data).splitlines()) == 2
+
+    assert client.get("/api/state/export").status_code == 404
+
+
+def test_nearby(client):
+    """Test /api/nearby returns the closest resources across models"""
+    with app.app_context():
+        db.session.add_all(
+            [
+                # downtown Austin, a few km north, San Antonio and Dallas
+                Housing(
+                    name="Austin House",
+                    category="Shelter",
+                    lat=30.267,
+                    lng=-97.743,
+                    place_id="g1",
+                ),
+                Counseling(
+                    name="North Austin Counseling",
+                    category="Therapy",
+                    lat=30.35,
+                    lng=-97.72,
+                    place_id="g2",
+                ),
+                Organizations(
+                    name="San Antonio Org",
+                    category="Support",
+                    lat=29.42,
+                    lng=-98.49,
+                    place_id="g3",
+                ),
+                Housing(
+                    name="Dallas House",
+                    category="Shelter",
+                    lat=32.78,
+                    lng=-96.8,
+                    place_id="g4",
+                ),
+            ]
+        )
+        db.session.commit()
+
+    response = client.get("/api/nearby?lat=30.27&lng=-97.74&limit=3")
+    assert response.status_code == 200
+    json_data = response.get_json()
+    names = [item["attributes"]["name"] for item in json_data["data"]]
+    assert names == ["Austin House", "North Austin Counseling", "San Antonio Org"]
+    assert [item["type"] for item in json_data["data"]] == [
+        "housing",
+        "counseling",
+        "organizations",
+    ]
+    distances = [item["meta"]["distance_km"] for item in json_data["data"]]
+    assert distances[0] < 1 and 8 < distances[1] < 11 and 110 < distances[2] < 125
+
+    response = client.get("/api/nearby?lat=30.27&lng=-97.74&radius_km=50")
+    assert len(response.get_json()["data"]) == 2
+    response = client.get("/api/nearby?lat=30.27&lng=-97.74&model=housing")
+    names = [item["attributes"]["name"] for item in response.get_json()["data"]]
+    assert names == ["Austin House", "Dallas House"]
+
+    # the index follows writes made after it was built
+    with app.app_context():
+        db.session.get(Housing, 3).lat = 40.0
+        db.session.commit()
+    response = client.get("/api/nearby?lat=30.27&lng=-97.74&limit=1")
+    first = response.get_json()["data"][0]
+    assert first["attributes"]["name"] == "North Austin Counseling"
+
+    assert client.get("/api/nearby?lng=-97.74").status_code == 400
+    assert client.get("/api/nearby?lat=95&lng=-97.74").status_code == 400
+    assert client.get("/api/nearby?lat=30&lng=-97&model=state").status_code == 400
+
+
+def test_bbox_and_clusters(client, monkeypatch):
+    """Test filter[bbox] and cluster=<zoom> on the list endpoints"""
+    with app.app_context():
+        db.session.add_all(
+            [
+                Housing(
+                    name=f"Austin {i}",
+                    category="Shelter" if i else "Transitional",
+                    lat=30.2 + i * 0.01,
+                    lng=-97.7,
+                    place_id=f"a{i}",
+                )
+                for i in range(3)
+            ]
+            + [
+                Housing(
+                    name="Dallas",
+                    category="Shelter",
+                    lat=32.78,
+                    lng=-96.8,
+                    place_id="d",
+                )
+            ]
+        )
+        db.session.commit()
+
+    austin = "filter[bbox]=-98,30,-97,31"
+    response = client.get(f"/api/housing?{austin}&page[size]=10")
+    names = [item["attributes"]["name"] for item in response.get_json()["data"]]
+    assert names == ["Austin 0", "Austin 1", "Austin 2"]
+    # combines with the other filters
+    response = client.get(f"/api/housing?{austin}&filter[category]=Transitional")
+    assert response.get_json()["meta"]["total"] == 1
+    # large boxes fall back to a range predicate with the same result
+    monkeypatch.setattr(app_module, "BBOX_MAX_IDS", 1)
+    response = client.get(f"/api/housing?{austin}&filter[name]=Austin 2")
+    assert response.get_json()["meta"]["total"] == 1
+
+    # few enough rows are returned as they are
+    response = client.get("/api/housing?cluster=5&page[size]=10")
+    assert response.get_json()["data"][0]["type"] == "housing"
+
+    # without a box the whole map is one viewport, capped at a bounded grid
+    monkeypatch.setattr(app_module, "CLUSTER_MIN_POINTS", 2)
+    json_data = client.get("/api/housing?cluster=5").get_json()
+    # total counts every match, clusters only the rows with coordinates
+    assert json_data["meta"]["total"] == 6
+    assert sum(item["attributes"]["count"] for item in json_data["data"]) == 4
+
+    texas = "filter[bbox]=-100,28,-95,34"
+    response = client.get(f"/api/housing?cluster=5&{texas}")
+    json_data = response.get_json()
+    assert json_data["meta"]["total"] == 4
+    clusters = sorted(
+        (item["attributes"] for item in json_data["data"]), key=lambda c: c["count"]
+    )
+    assert [c["count"] for c in clusters] == [1, 3]
+    assert clusters[1]["category"] == "Shelter"
+    assert abs(clusters[1]["lat"] - 30.21) < 1e-9
+
+    # other filters narrow the clusters too
+    response = client.get(f"/api/housing?cluster=5&{texas}&filter[category]=Shelter")
+    counts = sorted(item["attributes"]["count"] for item in response.get_json()["data"])
+    assert counts == [1, 2]
+
+    response = client.get("/api/housing?filter[bbox]=1,2,3")
+    assert response.status_code == 400
+    response = client.get("/api/housing?filter[bbox]=10,20,5,30")
+    assert response.status_code == 400
+
+
+def test_stats(client):
+    """Test /api/stats aggregates in SQL and caches until a table changes"""
+    with app.app_context():
+        db.session.add_all(
+            [
+                Housing(
+                    name="Housing C",
+                    category="Shelter",
+                    state="Texas",
+                    rating=4.5,
+                    types=["lodging", "point_of_interest"],
+                    place_id="h3",
+                ),
+                Housing(
+                    name="Housing D",
+                    category="Group Home",
+                    state="Texas",
+                    rating=5.0,
+                    types=["lodging"],
+                    place_id="h4",
+                ),
+            ]
+        )
+        db.session.commit()
+
+    response = client.get("/api/stats?model=housing")
+    assert response.status_code == 200
+    (housing,) = response.get_json()["data"]
+    assert housing["id"] == "housing"
+    stats = housing["attributes"]
+    assert stats["total"] == 4
+    assert stats["by_state"] == [
+        {"value": "Texas", "count": 3},
+        {"value": "Ohio", "count": 1},
+    ]
+    assert stats["by_category"][0] == {"value": "Shelter", "count": 3}
+    assert stats["by_type"] == [
+        {"value": "lodging", "count": 2},
+        {"value": "point_of_interest", "count": 1},
+    ]
+    # 5.0 falls in the top bin
+    assert [b["count"] for b in stats["rating_histogram"]] == [0, 0, 0, 0, 2]
+    assert stats["rating_histogram"][4]["range"] == "4.0-5.0"
+    assert stats["unrated"] == 2
+
+    # served from the cache until housing changes
+    with count_queries() as statements:
+        client.get("/api/stats?model=housing")
+    assert statements == []
+    with app.app_context():
+        db.session.add(Housing(name="Housing E", category="Shelter", place_id="h5"))
+        db.session.commit()
+    response = client.get("/api/stats")
+    assert [item["id"] for item in response.get_json()["data"]] == [
+        "housing",
+        "counseling",
+        "organizations",
+    ]
+    assert response.get_json()["data"][0]["attributes"]["total"] == 5
+    assert client.get("/api/stats?model=state").status_code == 400
+
+
+def test_types_filter(client, monkeypatch):
+    """Test filter[types] goes through the normalized type links"""
+    monkeypatch.setattr(app_module, "DATA_VERSION_POLL", 0)
+    with app.app_context():
+        db.session.add_all(
+            [
+                Housing(
+                    name="Housing C",
+                    category="Shelter",
+                    types=["lodging", "point_of_interest"],
+                    place_id="h3",
+                ),
+                Housing(
+                    name="Housing D",
+                    category="Shelter",
+                    types=["real_estate_agency"],
+                    place_id="h4",
+                ),
+            ]
+        )
+        db.session.commit()
+
+    def names(url):
+        data = client.get(url).get_json()["data"]
+        return [item["attributes"]["name"] for item in data]
+
+    assert names("/api/housing?filter[types]=lodging") == ["Housing C"]
+    assert names("/api/housing?filter[types]=lodging,real_estate_agency") == [
+        "Housing C",
+        "Housing D",
+    ]
+    # the JSON attribute is still served as it is
+    response = client.get("/api/housing?filter[types]=lodging")
+    assert response.get_json()["data"][0]["attributes"]["types"] == [
+        "lodging",
+        "point_of_interest",
+    ]
+
+    # updates and deletes keep the links in step
+    with count_queries() as statements:
+        with app.app_context():
+            db.session.get(Housing, 3).types = ["real_estate_agency"]
+            db.session.delete(db.session.get(Housing, 4))
+            db.session.commit()
+    # one statement each, though Housing C loses two links
+    assert sum(s.startswith("DELETE FROM housing_type") for s in statements) == 2
+    assert client.get("/api/housing?filter[types]=lodging").status_code == 404
+    assert names("/api/housing?filter[types]=real_estate_agency") == ["Housing C"]
+
+    # rows written around the ORM are linked by setup_db's sync
+    with app.app_context():
+        db.session.execute(
+            text(
+                "INSERT INTO housing (name, category, types, place_id) "
+                """VALUES ('Housing E', 'Shelter', '["lodging"]', 'h5')"""
+            )
+        )
+        db.session.commit()
+        assert sync_resource_types() == 1
+        assert sync_resource_types() == 0
+        mark_tables_changed("housing")
+    assert names("/api/housing?filter[types]=lodging") == ["Housing E"]
+
+
+def test_id_filter(client):
+    """Test filter[id] fetches an id set in request order with one IN query"""
+    with app.app_context():
+        texas = State.query.filter_by(name="Texas").first()
+        for i in range(4):
+            housing = Housing(
+                name=f"Housing Extra {i}", category="Shelter", place_id=f"hx{i}"
+            )
+            housing.states.append(texas)
+            db.session.add(housing)
+        db.session.commit()
+
+    def ids(response):
+        return [int(item["id"]) for item in response.get_json()["data"]]
+
+    # every id on one page, duplicates and unknown ids dropped
+    clear_caches()
+    with count_queries() as statements:
+        response = client.get("/api/housing?filter[id]=5,1,3,5,99")
+    assert response.status_code == 200
+    assert ids(response) == [5, 1, 3]
+    assert response.get_json()["meta"]["total"] == 3
+    # count + rows + state ids + one query per related model
+    assert len(statements) == 5
+    assert sum(" IN (" in statement for statement in statements[:2]) == 2
+    first = response.get_json()["data"][0]["attributes"]
+    assert [c["name"] for c in first["in_state_resources"]["counseling"]] == [
+        "Counseling A"
+    ]
+
+    # an explicit sort or page size still applies
+    response = client.get("/api/housing?filter[id]=5,1,3&sort=-id")
+    assert ids(response) == [5, 3, 1]
+    response = client.get("/api/housing?filter[id]=5,1,3&page[size]=2&page[number]=2")
+    assert ids(response) == [3]
+    response = client.get("/api/housing?filter[id]=4,2&fields[housing]=name")
+    assert response.get_json()["data"][1]["attributes"] == {
+        "name": "Housing B",
+        "matches": {},
+    }
+
+    assert client.get("/api/housing?filter[id]=98,99").status_code == 404
+    for value in ["1,x", ",", ",".join(str(i) for i in range(101))]:
+        response = client.get(f"/api/housing?filter[id]={value}")
+        assert response.status_code == 400, value
+
+
+def test_link_states(client):
+    """Test setup_db's state linking runs set-based and incrementally"""
+
+    def add_housing(name, state):
+        db.session.execute(
+            text(
+                "INSERT INTO housing (name, category, state, place_id) "
+                "VALUES (:n, 'Shelter', :s, :n)"
+            ),
+            {"n": name, "s": state},
+        )
+        db.session.commit()
+
+    def linked_states(name):
+        housing = Housing.query.filter_by(name=name).one()
+        db.session.refresh(housing)
+        return [state.name for state in housing.states]
+
+    with app.app_context():
+        add_housing("Housing C", "Texas")
+        add_housing("Housing D", " Nevada ")
+        add_housing("Housing E", None)
+        # fixture rows keep their links and are not linked twice
+        with count_queries() as statements:
+            assert link_states() == (["Nevada", "Unknown"], 3)
+        # missing states, their insert, then one INSERT ... SELECT per table
+        assert len(statements) == 5
+        assert link_states() == ([], 0)
+        assert linked_states("Housing A") == ["Texas"]
+        assert linked_states("Housing C") == ["Texas"]
+        assert linked_states("Housing D") == ["Nevada"]
+        assert linked_states("Housing E") == ["Unknown"]
+
+        # incremental runs only look at rows added since the last link
+        db.session.execute(text("DELETE FROM housing_state WHERE housing_id = 3"))
+        add_housing("Housing F", "Ohio")
+        assert link_states(incremental=True) == ([], 1)
+        assert linked_states("Housing C") == []
+        assert linked_states("Housing F") == ["Ohio"]
+        assert link_states() == ([], 1)
+        assert linked_states("Housing C") == ["Texas"]
+
+        # the type sync shares the watermark taken before linking
+        db.session.execute(
+            text("""UPDATE housing SET types = '["lodging"]' WHERE id = 3""")
+        )
+        add_housing("Housing G", "Ohio")
+        db.session.execute(
+            text("""UPDATE housing SET types = '["lodging"]' WHERE id = 7""")
+        )
+        db.session.commit()
+        floors = linked_id_floors()
+        assert floors[Housing] == 6
+        assert link_states(floors=floors) == ([], 1)
+        assert sync_resource_types(floors) == 1
+        assert sync_resource_types() == 1
+
+
+# Query shapes the managed indexes serve, and whether their ORDER BY must come
+# straight from an index. Substring filters (filter[name] etc.) scan by design.
+PLAN_SHAPES = [
+    ("/api/{model}?sort=name", True),
+    ("/api/{model}?sort=-rating", True),
+    ("/api/{model}?sort=state", True),
+    ("/api/{model}?sort=category", True),
+    ("/api/{model}?sort=-keyword", True),
+    ("/api/{model}?filter[keyword]={keyword}", True),
+    ("/api/{model}?filter[types]=lodging", True),
+    ("/api/{model}?filter[state]=Texas", False),
+    ("/api/{model}?filter[bbox]=-98,30,-97,31", False),
+    ("/api/{model}?search=shelter", False),
+]
+DETAIL_URLS = {
+    "housing": "/api/housing-resources/1",
+    "counseling": "/api/counseling/1",
+    "organizations": "/api/organizations/1",
+}
+FULL_SCAN = re.compile(r"SCAN (housing|counseling|organizations|\w+_state|\w+_type|state)$")
+
+
+def plan_problems(url, ordered_by_index):
+    """EXPLAIN every statement a request runs; list the plans that regress"""
+    # drop cached results, keep the in-memory indexes built by a first call
+    client = app.test_client()
+    client.get(url)
+    app_module._count_cache.clear()
+    app_module._state_cache.clear()
+    with count_queries(with_parameters=True) as statements:
+        assert client.get(url).status_code == 200, url
+    problems = []
+    connection = db.session.connection()
+    for statement, parameters in statements:
+        plan = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statement, parameters
+        ).all()
+        for detail in (row[3] for row in plan):
+            # unfiltered pages and counts walk the table or an index in order
+            if FULL_SCAN.match(detail) and re.search(r"\bWHERE\b", statement):
+                problems.append((url, statement, detail))
+            if (
+                ordered_by_index
+                and "TEMP B-TREE FOR ORDER BY" in detail
+                and re.search(r"\bLIMIT\b", statement)
+            ):
+                problems.append((url, statement, detail))
+    return problems
+
+
+def test_query_plans(client, monkeypatch):
+    """Test every supported query shape is served by an index on SQLite"""
+    # the bbox shape exercises the (lat, lng) range fallback
+    monkeypatch.setattr(app_module, "BBOX_MAX_IDS", 0)
+    with app.app_context():
+        # databases created before an index was declared get it from setup_db
+        db.session.execute(text("DROP INDEX ix_housing_rating_id"))
+        db.session.commit()
+        assert ensure_indexes() == ["ix_housing_rating_id"]
+        assert ensure_indexes() == []
+
+        for i, Model in enumerate([Housing, Counseling, Organizations]):
+            model = Model.__tablename__
+            db.session.add(
+                Model(
+                    name=f"Austin shelter {model}",
+                    category="Shelter",
+                    keyword=app_module.CATEGORIES[model][0],
+                    types=["lodging"],
+                    lat=30.27,
+                    lng=-97.74,
+                    rating=4.0,
+                    place_id=f"p{i}",
+                    states=[State.query.filter_by(name="Texas").one()],
+                )
+            )
+        db.session.commit()
+
+        problems = []
+        for model, detail_url in DETAIL_URLS.items():
+            keyword = app_module.CATEGORIES[model][0]
+            for shape, ordered_by_index in PLAN_SHAPES:
+                url = shape.format(model=model, keyword=keyword)
+                problems += plan_problems(url, ordered_by_index)
+            problems += plan_problems(detail_url, False)
+            for sort in ["-rating", "distance"]:
+                related = [m for m in DETAIL_URLS if m != model][0]
+                problems += plan_problems(
+                    f"{detail_url}?related[{related}][sort]={sort}", False
+                )
+            # keyset pages filter on (sort column, id)
+            next_link = client.get(
+                f"/api/{model}?sort=rating&page[size]=1&page[cursor]="
+            ).get_json()["links"]["next"]
+            cursor = cursor_from(next_link)
+            problems += plan_problems(
+                f"/api/{model}?sort=rating&page[size]=1&page[cursor]={cursor}", True
+            )
+        assert problems == []
+
+
 def test_get_counseling_by_id(client):
     """Test /api/counseling/<id>"""
     response = client.get("/api/counseling/1")
@@ -204,3 +1406,229 @@ def test_search_all(client):
     assert response.status_code == 400
     json_data = response.get_json()
     assert json_data["error"] == "No search query provided"
+
+
+@pytest.fixture
+def places_db(tmp_path):
+    """The app's tables in a SQLite file, opened with sqlite3 as the scraper does"""
+    path = tmp_path / "places.sqlite"
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    engine.dispose()
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def scraped(place_id, name, types=()):
+    return {
+        "place_id": place_id,
+        "name": name,
+        "formatted_address": "1 Main St",
+        "geometry": {"location": {"lat": 30.0, "lng": -97.0}},
+        "types": list(types),
+    }
+
+
+def test_place_writer_upsert(places_db):
+    """Test a rewrite refreshes a place but keeps its details when a lookup failed"""
+    details = ("(555) 010-0001", "https://example.org", "photo-1")
+    with PlaceWriter(places_db, dialect="sqlite") as writer:
+        places = [(scraped("p1", "Old Name"), details)]
+        writer.write("housing", "Texas", "housing", "supportive housing", places)
+    # the details lookup failed this time, and the search came from elsewhere
+    with PlaceWriter(places_db, dialect="sqlite") as writer:
+        places = [(scraped("p1", "New Name"), (None, None, None))]
+        writer.write("housing", "Ohio", "housing", "housing authority", places)
+    rows = places_db.execute(
+        "SELECT name, state, keyword, phone, website, photo_url FROM housing"
+    ).fetchall()
+    assert rows == [
+        (
+            "New Name",
+            "Texas",
+            "supportive housing",
+            "(555) 010-0001",
+            "https://example.org",
+            "photo-1",
+        )
+    ]
+    versions = places_db.execute("SELECT table_name, version FROM data_version")
+    assert versions.fetchall() == [("housing", 2)]
+
+
+def test_place_writer_type_links(places_db):
+    """Test written places' type links follow their types, stale ones included"""
+
+    def linked():
+        return sorted(
+            places_db.execute(
+                "SELECT h.place_id, t.name FROM housing_type l "
+                "JOIN housing h ON h.id = l.housing_id "
+                "JOIN resource_type t ON t.id = l.type_id"
+            ).fetchall()
+        )
+
+    def write(*places):
+        with PlaceWriter(places_db, dialect="sqlite") as writer:
+            places = [(place, (None, None, None)) for place in places]
+            writer.write("housing", "Texas", "housing", "supportive housing", places)
+
+    write(scraped("p1", "A", ["lodging", "point_of_interest"]), scraped("p2", "B"))
+    assert linked() == [("p1", "lodging"), ("p1", "point_of_interest")]
+
+    # a refresh that drops a type drops its link, and other places keep theirs
+    write(scraped("p2", "B", ["lodging"]))
+    write(scraped("p1", "A", ["point_of_interest", "real_estate_agency"]))
+    assert linked() == [
+        ("p1", "point_of_interest"),
+        ("p1", "real_estate_agency"),
+        ("p2", "lodging"),
+    ]
+    write(scraped("p1", "A"))
+    assert linked() == [("p2", "lodging")]
+
+
+def test_place_writer_checkpoint(places_db, tmp_path):
+    """Test only committed, complete searches are checkpointed and resumed"""
+    path = tmp_path / "checkpoint.json"
+    checkpoint = Checkpoint(str(path))
+    a = [(scraped("p1", "A"), (None, None, None))]
+    b = [(scraped("p2", "B"), (None, None, None))]
+    # an interrupted run commits nothing and records nothing
+    with pytest.raises(KeyboardInterrupt):
+        with PlaceWriter(places_db, dialect="sqlite", checkpoint=checkpoint) as writer:
+            writer.write("housing", "Texas", "housing", "a", a)
+            raise KeyboardInterrupt
+    assert Checkpoint(str(path)).get("Texas", "housing", "a") is None
+    assert places_db.execute("SELECT COUNT(*) FROM housing").fetchone() == (0,)
+
+    with PlaceWriter(places_db, dialect="sqlite", checkpoint=checkpoint) as writer:
+        writer.write("housing", "Texas", "housing", "a", a)
+        writer.write("housing", "Texas", "housing", "b", b, complete=False)
+    resumed = Checkpoint(str(path))
+    assert resumed.get("Texas", "housing", "a") == ["p1"]
+    assert resumed.get("Texas", "housing", "b") is None
+    resumed.clear()
+    assert not path.exists()
+
+
+def test_token_bucket():
+    """Test the scraper's rate limiter lets a burst through, then paces requests"""
+    data_scraping = pytest.importorskip("data_scraping")
+    bucket = data_scraping.TokenBucket(rate=50, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+    for _ in range(5):
+        bucket.acquire()
+    # five more tokens at 50 a second take at least 0.1s to refill
+    assert time.monotonic() - start >= 0.09
+
+
+
+@pytest.fixture
+def stubbed_scraper(monkeypatch):
+    """data_scraping pointed at a local places_stub with a generous quota"""
+    data_scraping = pytest.importorskip("data_scraping")
+    stub = PlacesStub(("127.0.0.1", 0), latency=0.1, pages=1)
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        data_scraping, "PLACES_API_URL", f"http://127.0.0.1:{stub.server_port}"
+    )
+    monkeypatch.setattr(data_scraping, "limiter", data_scraping.TokenBucket(1000, 100))
+    monkeypatch.setattr(data_scraping, "STATES", ["Texas", "Ohio", "Utah", "Iowa"])
+    monkeypatch.setattr(data_scraping, "cache", None)
+    yield data_scraping, stub
+    stub.shutdown()
+    stub.server_close()
+
+
+def test_scrape_throughput(stubbed_scraper):
+    """Test scrape() overlaps its searches and detail lookups"""
+    data_scraping, stub = stubbed_scraper
+    stored = []
+    started = time.monotonic()
+    total = data_scraping.scrape(lambda *search: stored.append(search))
+    elapsed = time.monotonic() - started
+
+    # 4 states x 3 categories, each one search and MAX_PER_STATE details
+    assert total == 12 * data_scraping.MAX_PER_STATE
+    assert stub.stats()["requests"] == {"textsearch": 12, "details": total}
+    assert all(complete for *_, complete in stored)
+    # one at a time the 72 requests would take 72 x 100ms = 7.2s
+    assert elapsed < 3.6
+
+
+def test_scrape_failed_lookup(stubbed_scraper, monkeypatch):
+    """Test one failing Places lookup is logged and the run carries on"""
+    data_scraping, _ = stubbed_scraper
+    failing = {}
+    fetch_place_details = data_scraping.fetch_place_details
+
+    def flaky_details(place_id):
+        if not failing:
+            failing["place_id"] = place_id
+        if place_id == failing["place_id"]:
+            raise ValueError("bad response")
+        return fetch_place_details(place_id)
+
+    def flaky_refresh(place_id):
+        raise ValueError("bad response")
+
+    monkeypatch.setattr(data_scraping, "fetch_place_details", flaky_details)
+    monkeypatch.setattr(data_scraping, "refresh_place", flaky_refresh)
+    stored = []
+    stale = [("Texas", "housing", "supportive housing", "p1")]
+    total = data_scraping.scrape(lambda *search: stored.append(search), stale=stale)
+    assert total == 12 * data_scraping.MAX_PER_STATE
+    # the place is kept without details and its search left to rerun
+    incomplete = [search for search in stored if not search[-1]]
+    assert len(incomplete) == 1
+    places = {place["place_id"]: values for place, values in incomplete[0][3]}
+    assert places[failing["place_id"]] == (None, None, None)
+
+
+def test_places_cache(tmp_path):
+    """Test cached responses expire after their TTL unless the cache is offline"""
+    path = str(tmp_path / "cache.sqlite")
+    cache = PlacesCache(path)
+    assert cache.get("textsearch:shelter", ttl=60) is None
+    cache.put("textsearch:shelter", {"results": [{"place_id": "p1"}]})
+    assert cache.get("textsearch:shelter", ttl=60) == {"results": [{"place_id": "p1"}]}
+    # age the entry past the TTL
+    with cache.lock:
+        cache.conn.execute("UPDATE response SET fetched_at = fetched_at - 120")
+        cache.conn.commit()
+    assert cache.get("textsearch:shelter", ttl=60) is None
+    assert cache.get("textsearch:shelter", ttl=300) is not None
+    assert (cache.hits, cache.misses) == (2, 2)
+    cache.close()
+
+    offline = PlacesCache(path, offline=True)
+    assert offline.get("textsearch:shelter", ttl=60) is not None
+    assert offline.get("textsearch:other", ttl=60) is None
+    offline.close()
+
+
+def test_plan_refresh(places_db):
+    """Test a routine run knows the stored places and refreshes the stale ones"""
+    data_scraping = pytest.importorskip("data_scraping")
+    with PlaceWriter(places_db, dialect="sqlite") as writer:
+        places = [(scraped(id, id), (None, None, None)) for id in ("p1", "p2")]
+        writer.write("housing", "Texas", "housing", "supportive housing", places)
+        places = [(scraped("p3", "p3"), (None, None, None))]
+        writer.write("counseling", "Ohio", "counseling", "youth trauma therapy", places)
+    places_db.execute(
+        "UPDATE housing SET retrieved_at = ? WHERE place_id = 'p2'",
+        ("2020-01-01 00:00:00",),
+    )
+    places_db.commit()
+
+    known, stale = data_scraping.plan_refresh(places_db)
+    assert known == {("Texas", "housing"): {"p1", "p2"}, ("Ohio", "counseling"): {"p3"}}
+    assert stale == [("Texas", "housing", "supportive housing", "p2")]
+    _, stale = data_scraping.plan_refresh(places_db, stale_after=datetime.timedelta(0))
+    assert len(stale) == 3
@@ -7,6 +7,22 @@ function isNearby(lat1, lng1, lat2, lng2) {
   return Math.abs(lat1 - lat2) <= LAT_LNG_THRESHOLD && Math.abs(lng1 - lng2) <= LAT_LNG_THRESHOLD;
 }
 
+// Attributes the related cards and isNearby read
+const NEARBY_FIELDS = "name,address,category,photo_url,website,lat,lng";
+
+// Server-side version of isNearby, so only nearby rows are downloaded.
+// An empty box is answered with a 404, which the callers treat as no rows.
+function nearbyUrl(base, lat, lng) {
+  const type = base.split("/").pop();
+  const bbox = [
+    lng - LAT_LNG_THRESHOLD,
+    lat - LAT_LNG_THRESHOLD,
+    lng + LAT_LNG_THRESHOLD,
+    lat + LAT_LNG_THRESHOLD,
+  ].join(",");
+  return `${base}?filter[bbox]=${bbox}&page[size]=100&fields[${type}]=${NEARBY_FIELDS}`;
+}
+
 export default function CounselingInstance() {
   const { id } = useParams();
   const [instance, setInstance] = useState(null);
@@ -30,11 +46,11 @@ export default function CounselingInstance() {
         const instanceLng = parseFloat(attrs.lng);
 
         // Fetch related housing
-        const housingRes = await fetch(`https://fosterfledging.me/api/housing?page[size]=100`, {
+        const housingRes = await fetch(nearbyUrl("https://fosterfledging.me/api/housing", instanceLat, instanceLng), {
           headers: { Accept: "application/vnd.api+json" },
         });
-        const housingData = await housingRes.json();
-        const housingItems = Array.isArray(housingData.data) ? housingData.data : [housingData.data];
+        const housingData = housingRes.ok ? await housingRes.json() : {};
+        const housingItems = Array.isArray(housingData.data) ? housingData.data : [];
         const nearbyHousing = housingItems.filter((i) => {
           const lat = parseFloat(i.attributes?.lat);
           const lng = parseFloat(i.attributes?.lng);
@@ -43,11 +59,11 @@ export default function CounselingInstance() {
         setRelatedHousing(nearbyHousing);
 
         // Fetch related organizations
-        const orgRes = await fetch(`https://fosterfledging.me/api/organizations?page[size]=100`, {
+        const orgRes = await fetch(nearbyUrl("https://fosterfledging.me/api/organizations", instanceLat, instanceLng), {
           headers: { Accept: "application/vnd.api+json" },
         });
-        const orgData = await orgRes.json();
-        const orgItems = Array.isArray(orgData.data) ? orgData.data : [orgData.data];
+        const orgData = orgRes.ok ? await orgRes.json() : {};
+        const orgItems = Array.isArray(orgData.data) ? orgData.data : [];
         const nearbyOrgs = orgItems.filter((i) => {
           const lat = parseFloat(i.attributes?.lat);
           const lng = parseFloat(i.attributes?.lng);
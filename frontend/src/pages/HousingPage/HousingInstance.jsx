@@ -7,6 +7,22 @@ function isNearby(lat1, lng1, lat2, lng2) {
   return Math.abs(lat1 - lat2) <= LAT_LNG_THRESHOLD && Math.abs(lng1 - lng2) <= LAT_LNG_THRESHOLD;
 }
 
+// Attributes the related cards and isNearby read
+const NEARBY_FIELDS = "name,address,category,photo_url,website,lat,lng";
+
+// Server-side version of isNearby, so only nearby rows are downloaded.
+// An empty box is answered with a 404, which the callers treat as no rows.
+function nearbyUrl(base, lat, lng) {
+  const type = base.split("/").pop();
+  const bbox = [
+    lng - LAT_LNG_THRESHOLD,
+    lat - LAT_LNG_THRESHOLD,
+    lng + LAT_LNG_THRESHOLD,
+    lat + LAT_LNG_THRESHOLD,
+  ].join(",");
+  return `${base}?filter[bbox]=${bbox}&page[size]=100&fields[${type}]=${NEARBY_FIELDS}`;
+}
+
 function RelatedSection({ title, items }) {
   if (!items || items.length === 0) {
     return (
@@ -100,12 +116,12 @@ export default function HousingInstance() {
 
 
         // Fetch counseling
-        fetch("https://fosterfledging.me/api/counseling?page[size]=100", {
+        fetch(nearbyUrl("https://fosterfledging.me/api/counseling", instanceLat, instanceLng), {
           headers: { Accept: "application/vnd.api+json" },
         })
-          .then((res) => res.json())
+          .then((res) => (res.ok ? res.json() : {}))
           .then((data) => {
-            const allItems = Array.isArray(data.data) ? data.data : [data.data];
+            const allItems = Array.isArray(data.data) ? data.data : [];
             const nearby = allItems.filter((i) => {
               const lat = parseFloat(i.attributes?.lat);
               const lng = parseFloat(i.attributes?.lng);
@@ -119,12 +135,12 @@ export default function HousingInstance() {
           });
 
         // Fetch organizations
-        fetch("https://fosterfledging.me/api/organizations?page[size]=100", {
+        fetch(nearbyUrl("https://fosterfledging.me/api/organizations", instanceLat, instanceLng), {
           headers: { Accept: "application/vnd.api+json" },
         })
-          .then((res) => res.json())
+          .then((res) => (res.ok ? res.json() : {}))
           .then((data) => {
-            const allItems = Array.isArray(data.data) ? data.data : [data.data];
+            const allItems = Array.isArray(data.data) ? data.data : [];
             const nearby = allItems.filter((i) => {
               const lat = parseFloat(i.attributes?.lat);
               const lng = parseFloat(i.attributes?.lng);
@@ -11,6 +11,22 @@ function isNearby(lat1, lng1, lat2, lng2) {
   );
 }
 
+// Attributes the related cards and isNearby read
+const NEARBY_FIELDS = "name,address,category,photo_url,website,lat,lng";
+
+// Server-side version of isNearby, so only nearby rows are downloaded.
+// An empty box is answered with a 404, which the callers treat as no rows.
+function nearbyUrl(base, lat, lng) {
+  const type = base.split("/").pop();
+  const bbox = [
+    lng - LAT_LNG_THRESHOLD,
+    lat - LAT_LNG_THRESHOLD,
+    lng + LAT_LNG_THRESHOLD,
+    lat + LAT_LNG_THRESHOLD,
+  ].join(",");
+  return `${base}?filter[bbox]=${bbox}&page[size]=100&fields[${type}]=${NEARBY_FIELDS}`;
+}
+
 function RelatedCard({ item }) {
   const attrs = item.attributes || item;
   return (
@@ -77,10 +93,10 @@ export default function OrganizationInstance() {
         const instanceLng = parseFloat(attrs.lng);
 
         // Related counseling
-        fetch("/api/counseling?page[size]=100", { headers: { Accept: "application/vnd.api+json" } })
-          .then((res) => res.json())
+        fetch(nearbyUrl("/api/counseling", instanceLat, instanceLng), { headers: { Accept: "application/vnd.api+json" } })
+          .then((res) => (res.ok ? res.json() : {}))
           .then((data) => {
-            const allItems = Array.isArray(data.data) ? data.data : [data.data];
+            const allItems = Array.isArray(data.data) ? data.data : [];
             setRelatedCounseling(allItems.filter(i => {
               const lat = parseFloat(i.attributes?.lat);
               const lng = parseFloat(i.attributes?.lng);
@@ -89,10 +105,10 @@ export default function OrganizationInstance() {
           });
 
         // Related housing
-        fetch("/api/housing?page[size]=100", { headers: { Accept: "application/vnd.api+json" } })
-          .then((res) => res.json())
+        fetch(nearbyUrl("/api/housing", instanceLat, instanceLng), { headers: { Accept: "application/vnd.api+json" } })
+          .then((res) => (res.ok ? res.json() : {}))
           .then((data) => {
-            const allItems = Array.isArray(data.data) ? data.data : [data.data];
+            const allItems = Array.isArray(data.data) ? data.data : [];
             setRelatedHousing(allItems.filter(i => {
               const lat = parseFloat(i.attributes?.lat);
               const lng = parseFloat(i.attributes?.lng);
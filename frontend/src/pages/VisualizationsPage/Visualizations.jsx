@@ -19,21 +19,25 @@ export default function Visualizations() {
   const [housing, setHousing] = useState([]);
   const [counseling, setCounseling] = useState([]);
   const [orgs, setOrgs] = useState([]);
+  const [stats, setStats] = useState({});
   const [loading, setLoading] = useState(true);
 
   const BASE = "https://fosterfledging.me/api";
   const threshold = 2; // Anything with less than this count goes into "Miscellaneous"
+  const MAP_FIELDS = "name,lat,lng,rating,state";
 
-  // Fetch all 3 models
+  // Chart aggregates come from /api/stats; the map only needs a few fields
   async function fetchData() {
     const endpoints = ["housing", "counseling", "organizations"];
-    const responses = await Promise.all(
-      endpoints.map(async (e) => {
-        const res = await fetch(`${BASE}/${e}?page[size]=250`);
+    const [statsJson, ...responses] = await Promise.all([
+      fetch(`${BASE}/stats`).then((res) => res.json()),
+      ...endpoints.map(async (e) => {
+        const res = await fetch(`${BASE}/${e}?page[size]=250&fields[${e}]=${MAP_FIELDS}`);
         const json = await res.json();
         return json.data.map((x) => x.attributes);
-      })
-    );
+      }),
+    ]);
+    setStats(Object.fromEntries(statsJson.data.map((s) => [s.id, s.attributes])));
     setHousing(responses[0]);
     setCounseling(responses[1]);
     setOrgs(responses[2]);
@@ -47,69 +51,33 @@ export default function Visualizations() {
   if (loading) return <h3>Loading data…</h3>;
 
   // ----------------------------- Helper Functions -----------------------------
-  const processData = (data) => {
-    const allTypes = data.flatMap((h) => h.types);
-
-    const typeCounts = allTypes.reduce((acc, type) => {
-      acc[type] = (acc[type] || 0) + 1;
-      return acc;
-    }, {});
-
-    const processedTypes = allTypes.map(
-      (t) => (typeCounts[t] < threshold ? "Miscellaneous" : t)
-    );
-
-    const chartData = Object.entries(
-      processedTypes.reduce((acc, t) => {
-        acc[t] = (acc[t] || 0) + 1;
-        return acc;
-      }, {})
-    ).map(([type, count]) => ({ type, count }));
-
-    const miscCount = chartData.find((d) => d.type === "Miscellaneous")?.count || 0;
-    const mainCount = chartData.reduce((sum, d) => sum + d.count, 0) - miscCount;
-    const chartDataMisc = [
-      { type: "Main Types", count: mainCount },
-      { type: "Miscellaneous", count: miscCount },
-    ];
-
-    const stateCounts = data.reduce((acc, h) => {
-      acc[h.state] = (acc[h.state] || 0) + 1;
-      return acc;
-    }, {});
-    const chartDataByState = Object.entries(stateCounts).map(([state, count]) => ({
-      state,
-      count,
-    }));
-
-    return { chartData, chartDataByState, chartDataMisc };
-  };
-
-  function getRatingHistogram(data, bins = 5) {
-    const ratings = data.map((d) => d.rating || 0);
-    const maxRating = Math.max(...ratings, 5);
-    const step = maxRating / bins;
-    const histogram = Array(bins).fill(0);
-
-    ratings.forEach((r) => {
-      let index = Math.min(Math.floor(r / step), bins - 1);
-      histogram[index]++;
+  const processData = (modelStats) => {
+    let miscCount = 0;
+    const chartData = [];
+    modelStats.by_type.forEach(({ value, count }) => {
+      if (count < threshold) miscCount += count;
+      else chartData.push({ type: value, count });
     });
+    if (miscCount) chartData.push({ type: "Miscellaneous", count: miscCount });
+    return { chartData };
+  };
 
-    return histogram.map((count, i) => ({
-      range: `${(i * step).toFixed(1)}-${((i + 1) * step).toFixed(1)}`,
-      count,
+  function getRatingHistogram(modelStats) {
+    // unrated resources are charted as a rating of 0
+    return modelStats.rating_histogram.map((bin, i) => ({
+      range: bin.range,
+      count: bin.count + (i === 0 ? modelStats.unrated : 0),
     }));
   }
 
   // ----------------------------- Chart Data -----------------------------
-  const housingCharts = processData(housing);
-  const counselingCharts = processData(counseling);
-  const orgCharts = processData(orgs);
+  const housingCharts = processData(stats.housing);
+  const counselingCharts = processData(stats.counseling);
+  const orgCharts = processData(stats.organizations);
 
-  const housingHist = getRatingHistogram(housing);
-  const counselingHist = getRatingHistogram(counseling);
-  const orgsHist = getRatingHistogram(orgs);
+  const housingHist = getRatingHistogram(stats.housing);
+  const counselingHist = getRatingHistogram(stats.counseling);
+  const orgsHist = getRatingHistogram(stats.organizations);
 
   const ratingChartData = housingHist.map((bin, i) => ({
     range: bin.range,